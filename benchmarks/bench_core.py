@@ -0,0 +1,235 @@
+"""Benchmarks for ImageProcessor, the EditPipeline undo history and the clipboard encode path.
+
+    python benchmarks/bench_core.py --quick
+    python benchmarks/bench_core.py --sizes 0.5 8 100 --modes RGB --json results.json
+    python benchmarks/bench_core.py --save-baseline          # record benchmarks/baseline.json
+    python benchmarks/bench_core.py                          # compare against it, exit 1 on regression
+
+Runs headless on Linux: only Pillow is needed. Every case runs in its own
+interpreter so its peak RSS is not inflated by the cases before it.
+Synthetic images are deterministic, part gradient and part noise, so both
+compressible and incompressible content is exercised.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+SIZES_MP = (0.5, 2, 8, 33, 100)
+QUICK_SIZES_MP = (0.5, 2)
+MODES = ("RGB", "RGBA", "L")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+TIME_THRESHOLD = 0.25
+RSS_THRESHOLD = 0.20
+HISTORY_DEPTH = 10
+
+
+def make_image(megapixels: float, mode: str):
+    from PIL import Image, ImageDraw
+    width = int((megapixels * 1e6 * 16 / 9) ** 0.5)
+    height = int(megapixels * 1e6 / width)
+    gradient = Image.linear_gradient("L").resize((width, height))
+    bands = [gradient, gradient.transpose(Image.Transpose.ROTATE_180), gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)]
+    image = Image.merge("RGB", bands)
+    # an incompressible band, like a photo pasted into a screenshot
+    noise_height = max(1, height // 8)
+    image.paste(Image.effect_noise((width, noise_height), 64).convert("RGB"), (0, 0))
+    draw = ImageDraw.Draw(image)
+    for x in range(0, width, max(1, width // 20)):
+        draw.rectangle((x, height // 2, x + width // 40, height // 2 + height // 10), fill=(x % 255, 30, 200))
+    if mode == "RGBA":
+        image.putalpha(gradient)
+    elif mode == "L":
+        image = image.convert("L")
+    return image
+
+
+def history_edits(image, count: int) -> list:
+    # successive edits that each touch a small region, like typical annotation work
+    edits = []
+    for i in range(count):
+        left, top = i * 37 % max(1, image.width - 64), i * 53 % max(1, image.height - 64)
+        edits.append({"op": "invert", "box": [left, top, left + 64, top + 64]})
+    return edits
+
+
+def build_history(image, edits: list):
+    # what the editor does per edit: record it, then render the new state
+    from edit_pipeline import EditPipeline
+    pipeline = EditPipeline(image)
+    for edit in edits:
+        pipeline.push(edit)
+        pipeline.render()
+    return pipeline
+
+
+def setup_case(case: str, image):
+    """Builds whatever the case needs outside the timed region; returns the timed callable."""
+    from clipboard_manager import ClipboardManager, FakeClipboardBackend
+    from image_processor import ImageProcessor
+
+    if case == "scale_50":
+        return lambda: ImageProcessor.scale(image, 0.5)
+    if case == "resize_fit":
+        return lambda: ImageProcessor.resize(image, 1280, 720)
+    if case == "to_grayscale":
+        return lambda: ImageProcessor.to_grayscale(image)
+    if case == "lower_quality":
+        return lambda: ImageProcessor.lower_quality(image)
+
+    edits = history_edits(image, HISTORY_DEPTH)
+    if case == "history_add":
+        return lambda: build_history(image, edits)
+
+    pipeline = build_history(image, edits)
+    if case == "history_undo_redo":
+        def run():
+            while pipeline.undo():
+                pipeline.render()
+            while pipeline.redo():
+                pipeline.render()
+        return run
+    if case == "history_truncate_full":
+        def run():
+            while pipeline.undo():
+                pass
+            pipeline.push({"op": "invert"})
+            pipeline.render()
+        return run
+    if case == "history_truncate_mid":
+        def run():
+            for _ in range(HISTORY_DEPTH // 2):
+                pipeline.undo()
+            pipeline.push({"op": "invert"})
+            pipeline.render()
+        return run
+
+    if case == "clipboard_dib":
+        class EncodingBackend(FakeClipboardBackend):
+            # stands in for win32clipboard.SetClipboardData, which consumes the DIB
+            def set_payload(self, payload, on_published=None):
+                payload.dib()
+                return super().set_payload(payload, on_published)
+
+        ClipboardManager.set_backend(EncodingBackend())
+        return lambda: ClipboardManager.copy_image_to_clipboard(image)
+    raise ValueError(f"Unknown case: {case}")
+
+
+CASES = ("scale_50", "resize_fit", "to_grayscale", "lower_quality", "history_add", "history_undo_redo",
+         "history_truncate_full", "history_truncate_mid", "clipboard_dib")
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_child(case: str, megapixels: float, mode: str, repeat: int) -> dict:
+    image = make_image(megapixels, mode)
+    timings = []
+    for _ in range(repeat):
+        func = setup_case(case, image)
+        rss_before = peak_rss_mb()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    rss_after = peak_rss_mb()
+    return {
+        "seconds": min(timings),
+        "peak_rss_mb": rss_after,
+        "setup_rss_mb": rss_before,
+    }
+
+
+def run_case(case: str, megapixels: float, mode: str, repeat: int) -> dict:
+    command = [sys.executable, os.path.abspath(__file__), "--child", case, str(megapixels), mode, str(repeat)]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr else "failed"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(results: dict, baseline: dict, time_threshold: float, rss_threshold: float) -> list:
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous or "error" in current or "error" in previous:
+            continue
+        if current["seconds"] > previous["seconds"] * (1 + time_threshold):
+            regressions.append(f"{key}: {previous['seconds']:.3f}s -> {current['seconds']:.3f}s")
+        if current.get("peak_rss_mb") and previous.get("peak_rss_mb") and \
+                current["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + rss_threshold):
+            regressions.append(f"{key}: peak RSS {previous['peak_rss_mb']:.0f} MB -> {current['peak_rss_mb']:.0f} MB")
+    return regressions
+
+
+def main() -> int:
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        case, megapixels, mode, repeat = sys.argv[2], float(sys.argv[3]), sys.argv[4], int(sys.argv[5])
+        print(json.dumps(run_child(case, megapixels, mode, repeat)))
+        return 0
+
+    parser = argparse.ArgumentParser(description="Benchmark the image processing core.")
+    parser.add_argument("--sizes", type=float, nargs="+", help=f"megapixels (default: {SIZES_MP})")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=CASES)
+    parser.add_argument("--quick", action="store_true", help=f"only {QUICK_SIZES_MP} MP")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case; the fastest is kept")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--time-threshold", type=float, default=TIME_THRESHOLD)
+    parser.add_argument("--rss-threshold", type=float, default=RSS_THRESHOLD)
+    args = parser.parse_args()
+
+    from PIL import __version__ as pillow_version
+    sizes = args.sizes or (QUICK_SIZES_MP if args.quick else SIZES_MP)
+    results = {}
+    for megapixels in sizes:
+        for mode in args.modes:
+            for case in args.cases:
+                key = f"{case}/{megapixels:g}MP/{mode}"
+                results[key] = run_case(case, megapixels, mode, args.repeat)
+                result = results[key]
+                if "error" in result:
+                    print(f"{key:<40} ERROR {result['error']}")
+                else:
+                    print(f"{key:<40}{result['seconds'] * 1000:10.1f} ms{result['peak_rss_mb'] or 0:10.0f} MB peak")
+
+    report = {
+        "meta": {"python": platform.python_version(), "pillow": pillow_version, "platform": platform.platform()},
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.time_threshold, args.rss_threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Cold and warm startup benchmark for the editor window.
+
+    python benchmarks/startup.py --runs 10 --json startup.json
+
+Each run launches src/main.py in a fresh interpreter with the startup trace
+enabled; the app prints its per-phase timings once deferred initialization
+has finished and exits. "cold" runs delete the bytecode caches first and
+run with -B, so every module is compiled again; "warm" runs reuse them.
+Needs a display and the GUI dependencies.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+sys.path.insert(0, SRC)
+from startup_timer import TRACE_ENV  # noqa: E402
+
+
+def clear_bytecode():
+    for directory, subdirs, _ in os.walk(SRC):
+        if "__pycache__" in subdirs:
+            shutil.rmtree(os.path.join(directory, "__pycache__"), ignore_errors=True)
+
+
+def run_once(cold: bool) -> dict:
+    if cold:
+        clear_bytecode()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, SRC]))
+    env[TRACE_ENV] = "1"
+    command = [sys.executable] + (["-B"] if cold else []) + [os.path.join(SRC, "main.py")]
+
+    start = time.perf_counter()
+    result = subprocess.run(command, env=env, capture_output=True, text=True, timeout=120)
+    wall = (time.perf_counter() - start) * 1000
+    lines = [line for line in result.stdout.splitlines() if line.startswith("{")]
+    if result.returncode != 0 or not lines:
+        raise RuntimeError(f"Startup run failed:\n{result.stderr}")
+
+    trace = json.loads(lines[-1])
+    trace["wall"] = wall
+    return trace
+
+
+def summarize(runs: list) -> dict:
+    phases = {phase: statistics.median(run["phases"][phase] for run in runs) for phase in runs[0]["phases"]}
+    return {
+        "phases": phases,
+        "total": statistics.median(run["total"] for run in runs),
+        "wall": statistics.median(run["wall"] for run in runs),
+        "runs": len(runs),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="write the medians to this file")
+    args = parser.parse_args()
+
+    results = {"cold": summarize([run_once(cold=True) for _ in range(args.runs)])}
+    run_once(cold=False)  # repopulate the bytecode cache
+    results["warm"] = summarize([run_once(cold=False) for _ in range(args.runs)])
+
+    for kind, summary in results.items():
+        print(f"{kind}: {summary['total']:.0f} ms to interactive, {summary['wall']:.0f} ms process wall time")
+        for phase, ms in summary["phases"].items():
+            print(f"  {phase:<18}{ms:8.1f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
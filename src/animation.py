@@ -0,0 +1,158 @@
+import threading
+from collections import deque
+from io import BytesIO
+from typing import Optional
+from PIL import Image
+from edit_pipeline import apply_step, build_plan
+from image_processor import ImageProcessor
+
+ANIMATED_FORMATS = ("GIF", "PNG", "WEBP")
+DEFAULT_DURATION = 100
+PREVIEW_BOX = (700, 700)
+# how GIF and APNG number "leave the frame", "clear to background" and "restore the previous frame"
+DISPOSAL_CODES = {"GIF": (1, 2, 3), "PNG": (0, 1, 2)}
+
+
+def is_animated(image: Image.Image) -> bool:
+    return getattr(image, "n_frames", 1) > 1
+
+
+def frame_disposal(image: Image.Image) -> int:
+    # 0 leave, 1 clear to background, 2 restore previous, whatever the source format
+    if image.format == "GIF":
+        return {2: 1, 3: 2}.get(getattr(image, "disposal_method", 0), 0)
+    if image.format == "PNG":
+        return int(image.info.get("disposal", 0))
+    return 0
+
+
+def render_frame(frame: Image.Image, plan: tuple) -> Image.Image:
+    # runs in a worker process; frames arrive and leave pickled
+    for step in plan:
+        frame = apply_step(frame, step)
+    return frame
+
+
+def scale_plan(plan: tuple, size: tuple, preview_size: tuple) -> tuple:
+    """The plan for an image of size, adapted to a preview_size copy: sizes, regions and blocks scale along."""
+    ratio = preview_size[0] / size[0]
+    steps = []
+    for step in plan:
+        name = step[0]
+        if name == "resize":
+            steps.append(("resize", max(1, round(step[1] * ratio)), max(1, round(step[2] * ratio))))
+        elif name == "pixelate":
+            steps.append(("pixelate", max(1, round(step[1] * ratio))))
+        elif name == "region":
+            left, top, right, bottom = (round(value * ratio) for value in step[1])
+            box = (left, top, max(right, left + 1), max(bottom, top + 1))
+            inner = scale_plan(step[2], (step[1][2] - step[1][0], step[1][3] - step[1][1]),
+                               (box[2] - box[0], box[3] - box[1]))
+            steps.append(("region", box, inner))
+        else:
+            steps.append(step)
+    return tuple(steps)
+
+
+def process_frames(frames, plan: tuple, executor=None, window: int = 4):
+    """Yields the rendered frames in order, with at most window frames decoded and in flight at once."""
+    if not plan or executor is None:
+        for frame in frames:
+            yield render_frame(frame, plan)
+        return
+    pending = deque()
+    for frame in frames:
+        pending.append(executor.submit(render_frame, frame, plan))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class Animation:
+    """An animated GIF, WebP or APNG whose frames are decoded one at a time.
+
+    Only the encoded source (a path, or the bytes for clipboard images) is
+    kept; frames() decodes and composites each frame when it is asked for.
+    The first full pass, normally the background build of the preview
+    frames, also records the frame durations and disposal that export
+    writes back out.
+    """
+
+    def __init__(self, image: Image.Image, source):
+        self.source = source
+        self.format = image.format
+        self.n_frames = image.n_frames
+        self.size = image.size
+        # absent for GIFs that play once; passing loop=0 would make them repeat forever
+        self.loop = image.info.get("loop")
+        self.mode = "RGBA" if "transparency" in image.info or "A" in image.getbands() else "RGB"
+        self.durations = None
+        self.disposal = None
+        self.previews = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def open(cls, image: Image.Image, source=None) -> Optional["Animation"]:
+        if not is_animated(image):
+            return None
+        source = source or getattr(image, "filename", None)
+        if not source and isinstance(getattr(image, "fp", None), BytesIO):
+            source = image.fp.getvalue()
+        return cls(image, source) if source else None
+
+    def frames(self):
+        with Image.open(BytesIO(self.source) if isinstance(self.source, bytes) else self.source) as image:
+            for index in range(self.n_frames):
+                image.seek(index)
+                yield image.convert(self.mode)
+
+    def scan(self, box: tuple = PREVIEW_BOX) -> list:
+        """Downscaled copies of every frame for playback; records the timing on the way."""
+        with self.lock:
+            if self.previews is None:
+                previews, durations, disposal = [], [], []
+                with Image.open(BytesIO(self.source) if isinstance(self.source, bytes) else self.source) as image:
+                    for index in range(self.n_frames):
+                        image.seek(index)
+                        # WebP only fills in the duration once the frame is loaded
+                        frame = image.convert(self.mode)
+                        durations.append(image.info.get("duration") or DEFAULT_DURATION)
+                        disposal.append(frame_disposal(image))
+                        previews.append(ImageProcessor.thumbnail(frame, box))
+                self.previews, self.durations, self.disposal = previews, durations, disposal
+            return self.previews
+
+    def timing(self) -> tuple:
+        if self.durations is None:
+            self.scan()
+        return self.durations, self.disposal
+
+    def preview(self, plan: tuple) -> tuple:
+        """Playback frames with the plan applied, and their durations."""
+        previews = self.scan()
+        small_plan = scale_plan(plan, self.size, previews[0].size)
+        return [render_frame(frame, small_plan) for frame in previews], self.durations
+
+    def save(self, destination, format: str, operations: list, options: dict = None, executor=None,
+             window: int = 4):
+        """Writes every frame with operations applied, keeping durations, loop count and disposal.
+
+        Frames are decoded and processed a window at a time, but Pillow's
+        writers need every processed frame before they write the file.
+        """
+        durations, disposal = self.timing()
+        plan = build_plan(self.size, self.mode, operations)
+        # the writers expect every frame in one mode, e.g. APNG disposal fails on grayscale frames
+        frames = (frame if frame.mode == self.mode else frame.convert(self.mode)
+                  for frame in process_frames(self.frames(), plan, executor, window))
+        first, *rest = frames
+        params = dict(options or {}, save_all=True, append_images=rest, duration=durations)
+        if self.loop is not None:
+            params["loop"] = self.loop
+        elif format != "GIF":
+            # APNG and WebP count plays rather than repeats; one play is how a GIF without a loop count behaves
+            params["loop"] = 1
+        if format in DISPOSAL_CODES:
+            params["disposal"] = [DISPOSAL_CODES[format][value] for value in disposal]
+        first.save(destination, format, **params)
@@ -0,0 +1,258 @@
+"""Headless batch mode: apply ImageProcessor operations to many files.
+
+    python src/batch.py screenshots/ -o out/ --op scale=0.5 --op grayscale
+
+Only depends on Pillow, so it runs on CI and servers without a display.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from PIL import Image
+from animation import ANIMATED_FORMATS, Animation, is_animated
+from edit_pipeline import EditPipeline, validate_operation
+from image_processor import PIXELATE_BLOCK, ImageProcessor
+from tiled_processor import TiledProcessor
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp", ".tif", ".tiff"}
+MANIFEST_NAME = ".quickimgeditor-batch.json"
+
+
+def parse_operation(text: str) -> dict:
+    """Parses 'grayscale', 'lower_quality', 'invert', 'scale=0.5', 'resize=800x600', 'brightness=1.2',
+    'contrast=0.9', 'gamma=1.8', 'levels=16:235' or 'pixelate=16'; '@left,top,right,bottom' limits
+    an operation to a region, e.g. 'pixelate=12@40,40,360,120'."""
+    text, _, box = text.partition("@")
+    name, _, value = text.partition("=")
+    name = name.strip().replace("-", "_")
+    if name == "scale":
+        operation = {"op": "scale", "factor": float(value)}
+    elif name == "resize":
+        width, _, height = value.lower().partition("x")
+        operation = {"op": "resize", "width": int(width), "height": int(height)}
+    elif name in ("brightness", "contrast"):
+        operation = {"op": name, "factor": float(value)}
+    elif name == "gamma":
+        operation = {"op": "gamma", "value": float(value)}
+    elif name == "levels":
+        black, _, white = value.partition(":")
+        operation = {"op": "levels", "black": int(black), "white": int(white)}
+    elif name == "pixelate":
+        operation = {"op": "pixelate", "block": int(value) if value else PIXELATE_BLOCK}
+    else:
+        operation = {"op": name}
+    if box:
+        operation["box"] = [int(value) for value in box.split(",")]
+    return validate_operation(operation)
+
+
+def find_inputs(patterns: list, recursive: bool) -> list:
+    inputs = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            root = pattern
+            pattern = os.path.join(pattern, "**", "*") if recursive else os.path.join(pattern, "*")
+        else:
+            root = os.path.dirname(pattern.split("*")[0]) or "."
+        for path in sorted(glob.glob(pattern, recursive=recursive)):
+            if os.path.isfile(path) and os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS:
+                inputs.append((path, os.path.relpath(path, root)))
+    return inputs
+
+
+def output_path(relative: str, output_dir: str, extension: str = None) -> str:
+    if extension:
+        relative = os.path.splitext(relative)[0] + "." + extension.lstrip(".")
+    return os.path.join(output_dir, relative)
+
+
+def recipe_key(operations: list, extension: str = None) -> str:
+    text = json.dumps({"operations": operations, "extension": extension}, sort_keys=True)
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def source_stamp(source: str, recipe: str) -> list:
+    return [os.stat(source).st_mtime_ns, recipe]
+
+
+def load_manifest(path: str) -> dict:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logging.error(f"Error loading {path}: {str(e)}")
+        return {}
+
+
+def save_manifest(path: str, manifest: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary = path + ".part"
+    with open(temporary, "w") as f:
+        json.dump(manifest, f)
+    os.replace(temporary, path)
+
+
+def is_up_to_date(destination: str, stamp: list, recorded: list) -> bool:
+    # same source modification time and same recipe and format as the run that wrote destination
+    return recorded == stamp and os.path.exists(destination)
+
+
+def source_size(source) -> int:
+    # a path, or the in-memory file of an image sent over IPC
+    return os.path.getsize(source) if isinstance(source, str) else source.getbuffer().nbytes
+
+
+def process_file(source, destination: str, operations: list, memory_limit: int = None) -> tuple:
+    # runs in a worker process: read, edit and write one file, return only the stats
+    start = time.perf_counter()
+    # with a memory limit the image is processed in strips, so Pillow's pixel limit does not apply
+    with (ImageProcessor.open_unbounded(source) if memory_limit else Image.open(source)) as image:
+        output_format = Image.registered_extensions().get(os.path.splitext(destination)[1].lower())
+        if is_animated(image) and output_format in ANIMATED_FORMATS:
+            # every frame, one at a time; this process is already one of the batch's workers
+            os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+            temporary = destination + ".part"
+            with open(temporary, "wb") as f:
+                Animation(image, source if isinstance(source, str) else source.getvalue()).save(
+                    f, output_format, operations)
+            os.replace(temporary, destination)
+            return source_size(source), os.path.getsize(destination), time.perf_counter() - start
+
+        pipeline = EditPipeline(image, operations, cache_bytes=0)
+        if memory_limit:
+            os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+            TiledProcessor.render(image, pipeline.plan(), destination, memory_limit)
+            return source_size(source), os.path.getsize(destination), time.perf_counter() - start
+
+        result = pipeline.render()
+        if os.path.splitext(destination)[1].lower() in (".jpg", ".jpeg") and result.mode not in ("RGB", "L"):
+            result = result.convert("RGB")
+
+        os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+        # write next to the destination and rename, so an interrupted run never leaves a partial file
+        temporary = destination + ".part"
+        result.save(temporary, format=output_format)
+        os.replace(temporary, destination)
+    return source_size(source), os.path.getsize(destination), time.perf_counter() - start
+
+
+def run(inputs: list, output_dir: str, operations: list, workers: int = None, max_in_flight: int = None,
+        extension: str = None, force: bool = False, memory_limit: int = None) -> dict:
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 2
+    stats = {"processed": 0, "skipped": 0, "failed": 0, "bytes_in": 0, "bytes_out": 0}
+    start = time.perf_counter()
+
+    # output path -> [source mtime, recipe key] of the run that wrote it
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    recipe = recipe_key(operations, extension)
+
+    jobs = iter(inputs)
+    pending = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while True:
+                # keep at most max_in_flight files decoded at once across all workers
+                while len(pending) < max_in_flight:
+                    try:
+                        source, relative = next(jobs)
+                    except StopIteration:
+                        break
+                    destination = output_path(relative, output_dir, extension)
+                    key = os.path.relpath(destination, output_dir)
+                    try:
+                        stamp = source_stamp(source, recipe)
+                    except OSError as e:
+                        logging.error(f"Failed reading {source}: {e}")
+                        stats["failed"] += 1
+                        continue
+                    if not force and is_up_to_date(destination, stamp, manifest.get(key)):
+                        stats["skipped"] += 1
+                        continue
+                    future = executor.submit(process_file, source, destination, operations, memory_limit)
+                    pending[future] = (source, key, stamp)
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    source, key, stamp = pending.pop(future)
+                    try:
+                        bytes_in, bytes_out, _ = future.result()
+                    except Exception as e:
+                        logging.error(f"Failed processing {source}: {e}")
+                        stats["failed"] += 1
+                        manifest.pop(key, None)
+                        continue
+                    stats["processed"] += 1
+                    stats["bytes_in"] += bytes_in
+                    stats["bytes_out"] += bytes_out
+                    manifest[key] = stamp
+    finally:
+        # also after an interrupted run, so the files already written are not redone
+        if stats["processed"] or stats["failed"]:
+            save_manifest(manifest_path, manifest)
+
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def format_summary(stats: dict) -> str:
+    seconds = max(stats["seconds"], 1e-9)
+    return (
+        f"{stats['processed']} processed, {stats['skipped']} up to date, {stats['failed']} failed "
+        f"in {stats['seconds']:.2f}s ({stats['processed'] / seconds:.1f} images/s, "
+        f"{stats['bytes_in'] / seconds / 1e6:.1f} MB/s read, {stats['bytes_out'] / 1e6:.1f} MB written)"
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Apply QuickImgEditor operations to many images.")
+    parser.add_argument("inputs", nargs="+", help="input directories or glob patterns")
+    parser.add_argument("-o", "--output", required=True, help="output directory")
+    parser.add_argument("--op", action="append", default=[], type=parse_operation, dest="operations",
+                        help="operation to apply, in order: scale=F, resize=WxH, grayscale, lower_quality, "
+                             "brightness=F, contrast=F, gamma=G, levels=BLACK:WHITE, invert")
+    parser.add_argument("--recipe", help="JSON file with a list of operations, applied before any --op")
+    parser.add_argument("-r", "--recursive", action="store_true", help="descend into input directories")
+    parser.add_argument("--format", help="output file extension, e.g. png or webp (default: keep)")
+    parser.add_argument("-j", "--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--max-in-flight", type=int, help="files being processed at once (default: 2x workers)")
+    parser.add_argument("--memory-limit", type=int, metavar="MB",
+                        help="process each image in strips using at most this much working memory")
+    parser.add_argument("-f", "--force", action="store_true", help="reprocess files that are up to date")
+    return parser
+
+
+def main(argv: list = None) -> int:
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(message)s")
+    args = build_parser().parse_args(argv)
+
+    operations = []
+    if args.recipe:
+        with open(args.recipe, "r") as f:
+            operations = [validate_operation(op) for op in json.load(f)]
+    operations += args.operations
+
+    inputs = find_inputs(args.inputs, args.recursive)
+    if not inputs:
+        print("No input images found", file=sys.stderr)
+        return 1
+
+    memory_limit = args.memory_limit * 1024 * 1024 if args.memory_limit else None
+    stats = run(inputs, args.output, operations, args.workers, args.max_in_flight, args.format, args.force,
+                memory_limit)
+    print(format_summary(stats))
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,44 +1,73 @@
-from collections import deque
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
 from PIL import Image
+from profiler import timed
 
+TILE_SIZE = 256
+COMPRESS_LEVEL = 1
 
-class ChangesHistory():
-    def __init__(self):
-        self.queue = deque(maxlen=10)
-        self.current_index = -1
-
-    def add(self, image: Image.Image):
-        # Remove the oldest image if the queue is full
-        if len(self.queue) == self.queue.maxlen:
-            self.queue.popleft()
-            self.current_index -= 1
-
-        # If the current index is at the end of the queue, append the new image
-        if self.current_index == len(self.queue) - 1:
-            self.queue.append(image)
-            self.current_index += 1
-        else:
-            # Remove all images after the current index
-            self.queue = deque(list(self.queue)[:self.current_index + 1], maxlen=10)
-            # Add the new image
-            self.queue.append(image)
-            self.current_index += 1
-
-    def undo(self) -> None | Image.Image:
-        if self.current_index == -1:
-            return None
-        self.current_index -= 1
-        if self.current_index < 0:
-            self.current_index = 0
-            return None
-        return self.queue[self.current_index]
-
-    def redo(self) -> None | Image.Image:
-        if self.current_index == len(self.queue) - 1:
-            return None
-        self.current_index += 1
-        if self.current_index >= len(self.queue):
-            self.current_index = len(self.queue) - 1
-            return None
-        return self.queue[self.current_index]
 
+class Snapshot():
+    """An image stored as zlib-compressed tiles.
+
+    Identical tiles share the same compressed blob, so flat areas cost
+    almost nothing. The workspace spills the snapshot of an evicted image's
+    original to a temp file and decodes it again when the image is selected.
+    """
+
+    def __init__(self, image: Image.Image):
+        self.size = image.size
+        self.mode = image.mode
+        self.palette = image.getpalette() if image.mode == "P" else None
+        self.path = None
+        self.disk_bytes = 0
+
+        known = {}
+        self.tiles = {}
+        for box in self.tile_boxes():
+            raw = image.crop(box).tobytes()
+            digest = hashlib.blake2b(raw, digest_size=16).digest()
+            blob = known.get(digest)
+            if blob is None:
+                blob = known[digest] = zlib.compress(raw, COMPRESS_LEVEL)
+            self.tiles[box] = (digest, blob)
+
+    def tile_boxes(self):
+        width, height = self.size
+        for y in range(0, height, TILE_SIZE):
+            for x in range(0, width, TILE_SIZE):
+                yield x, y, min(x + TILE_SIZE, width), min(y + TILE_SIZE, height)
+
+    def spill(self, directory: str):
+        fd, self.path = tempfile.mkstemp(suffix=".tiles", dir=directory)
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(self.tiles, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.disk_bytes = os.path.getsize(self.path)
+        self.tiles = None
+
+    def discard(self):
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+            self.disk_bytes = 0
+
+    @timed("snapshot.decode")
+    def decode(self) -> Image.Image:
+        tiles = self.tiles
+        if tiles is None:
+            with open(self.path, "rb") as f:
+                tiles = pickle.load(f)
+
+        image = Image.new(self.mode, self.size)
+        for box, (_, blob) in tiles.items():
+            tile_size = (box[2] - box[0], box[3] - box[1])
+            image.paste(Image.frombytes(self.mode, tile_size, zlib.decompress(blob)), box[:2])
+        if self.palette is not None:
+            image.putpalette(self.palette)
+        return image
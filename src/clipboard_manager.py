@@ -1,22 +1,353 @@
 from io import BytesIO
+import hashlib
 import logging
-import win32clipboard
+import os
+import shutil
+import subprocess
+import sys
+import threading
 from PIL import ImageGrab, Image
 from typing import Optional
+from profiler import Profiler, timed
 
-THUMBNAIL_SIZE = (700, 700)
+BMP_FILE_HEADER_SIZE = 14
+# below this many raw bytes, encoding up front is cheaper than setting up delayed rendering
+DELAYED_RENDER_THRESHOLD = 4 * 1024 * 1024
+# change token of a clipboard known to hold no image
+NO_IMAGE = b"no image"
+
+
+class ClipboardPayload:
+    """An image on its way to the clipboard, encoded lazily and at most once per format."""
+
+    def __init__(self, image: Image.Image):
+        self.image = image
+        self.encoded = {}
+        self.lock = threading.Lock()
+
+    @timed("clipboard.encode_dib")
+    def dib(self) -> memoryview:
+        # a DIB is a BMP file without its 14-byte file header; share the buffer instead of slicing a copy
+        with self.lock:
+            if "DIB" not in self.encoded:
+                output = BytesIO()
+                self.image.save(output, format="BMP")
+                self.encoded["DIB"] = output.getbuffer()[BMP_FILE_HEADER_SIZE:]
+            return self.encoded["DIB"]
+
+    @timed("clipboard.encode_png")
+    def png(self) -> bytes:
+        with self.lock:
+            if "PNG" not in self.encoded:
+                output = BytesIO()
+                self.image.save(output, format="PNG", compress_level=1)
+                self.encoded["PNG"] = output.getvalue()
+            return self.encoded["PNG"]
+
+
+class ClipboardBackend:
+    """Platform clipboard access. Subclasses implement set_payload.
+
+    set_payload calls on_published with the change token of the clipboard
+    once it holds the payload, so the editor can tell its own copies apart.
+    Backends that can hold an encoded file as is list the formats in
+    encoded_formats, mapped to the clipboard type they use, and implement
+    set_encoded.
+    """
+    encoded_formats = {}
+
+    def change_token(self):
+        # a value that changes whenever the clipboard does; None when it cannot be told
+        return None
+
+    def get_image(self) -> Optional[Image.Image]:
+        image = ImageGrab.grabclipboard()
+        return image if isinstance(image, Image.Image) else None
+
+    def set_payload(self, payload: ClipboardPayload, on_published=None) -> bool:
+        raise NotImplementedError
+
+    def set_encoded(self, data: bytes, format: str, on_published=None) -> bool:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class WindowsClipboardBackend(ClipboardBackend):
+    """CF_DIB and PNG on the Windows clipboard.
+
+    Large images are offered with delayed rendering: the formats are
+    announced immediately and only encoded when another application
+    actually pastes, through WM_RENDERFORMAT on a hidden owner window.
+    Encoded files go under the registered format applications look for.
+    """
+    encoded_formats = {"JPEG": "JFIF", "PNG": "PNG", "WEBP": "image/webp"}
+
+    def __init__(self):
+        import win32clipboard
+        self.win32clipboard = win32clipboard
+        self.png_format = win32clipboard.RegisterClipboardFormat("PNG")
+        self.payload = None
+        self.hwnd = None
+
+    def change_token(self):
+        return self.win32clipboard.GetClipboardSequenceNumber()
+
+    def render(self, clipboard_format: int):
+        if clipboard_format == self.win32clipboard.CF_DIB:
+            return self.payload.dib()
+        return self.payload.png()
+
+    def owner_window(self):
+        if self.hwnd is None:
+            import win32api
+            import win32con
+            import win32gui
+            window_class = win32gui.WNDCLASS()
+            window_class.lpszClassName = "QuickImgEditorClipboardOwner"
+            window_class.hInstance = win32api.GetModuleHandle(None)
+            window_class.lpfnWndProc = {
+                win32con.WM_RENDERFORMAT: self.on_render_format,
+                win32con.WM_RENDERALLFORMATS: self.on_render_all_formats,
+                win32con.WM_DESTROYCLIPBOARD: self.on_destroy_clipboard,
+            }
+            win32gui.RegisterClass(window_class)
+            # message-only window; its messages are pumped by the Tk main loop on this thread
+            self.hwnd = win32gui.CreateWindow(
+                window_class.lpszClassName, "", 0, 0, 0, 0, 0,
+                win32con.HWND_MESSAGE, 0, window_class.hInstance, None
+            )
+        return self.hwnd
+
+    def on_render_format(self, hwnd, msg, wparam, lparam):
+        # the clipboard is already open by the requesting application
+        if self.payload is not None:
+            self.win32clipboard.SetClipboardData(wparam, self.render(wparam))
+        return 0
+
+    def on_render_all_formats(self, hwnd, msg, wparam, lparam):
+        # we are going away while still owning the clipboard: render everything now
+        if self.payload is None:
+            return 0
+        self.win32clipboard.OpenClipboard(hwnd)
+        try:
+            if self.win32clipboard.GetClipboardOwner() == hwnd:
+                for clipboard_format in (self.win32clipboard.CF_DIB, self.png_format):
+                    self.win32clipboard.SetClipboardData(clipboard_format, self.render(clipboard_format))
+        finally:
+            self.win32clipboard.CloseClipboard()
+        return 0
+
+    def on_destroy_clipboard(self, hwnd, msg, wparam, lparam):
+        self.payload = None
+        return 0
+
+    def set_payload(self, payload: ClipboardPayload, on_published=None) -> bool:
+        delayed = payload.image.width * payload.image.height * 4 > DELAYED_RENDER_THRESHOLD
+        hwnd = self.owner_window() if delayed else None
+        self.win32clipboard.OpenClipboard(hwnd)
+        try:
+            self.win32clipboard.EmptyClipboard()
+            self.payload = payload if delayed else None
+            for clipboard_format in (self.win32clipboard.CF_DIB, self.png_format):
+                data = None if delayed else self.render_now(payload, clipboard_format)
+                self.win32clipboard.SetClipboardData(clipboard_format, data)
+        finally:
+            self.win32clipboard.CloseClipboard()
+        if on_published:
+            on_published(self.change_token())
+        return True
+
+    def set_encoded(self, data: bytes, format: str, on_published=None) -> bool:
+        clipboard_format = self.win32clipboard.RegisterClipboardFormat(self.encoded_formats[format])
+        self.win32clipboard.OpenClipboard(None)
+        try:
+            self.win32clipboard.EmptyClipboard()
+            self.payload = None
+            self.win32clipboard.SetClipboardData(clipboard_format, data)
+        finally:
+            self.win32clipboard.CloseClipboard()
+        if on_published:
+            on_published(self.change_token())
+        return True
+
+    def render_now(self, payload: ClipboardPayload, clipboard_format: int):
+        return payload.dib() if clipboard_format == self.win32clipboard.CF_DIB else payload.png()
+
+    def close(self):
+        if self.hwnd is not None:
+            import win32gui
+            # destroying the owner triggers WM_RENDERALLFORMATS so pending data survives us
+            win32gui.DestroyWindow(self.hwnd)
+            self.hwnd = None
+
+
+class LinuxClipboardBackend(ClipboardBackend):
+    """PNG on the X11 or Wayland clipboard through xclip or wl-copy.
+
+    Encoding and handing the data to the helper happen on a background
+    thread, so copying returns immediately. Encoded files are offered under
+    their own MIME type.
+    """
+    encoded_formats = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+    def __init__(self):
+        if os.environ.get("WAYLAND_DISPLAY") and shutil.which("wl-copy"):
+            self.command = ["wl-copy", "--type", "image/png"]
+            self.paste_command = ["wl-paste", "--no-newline", "--type", "image/png"]
+            self.targets_command = ["wl-paste", "--list-types"]
+        elif shutil.which("xclip"):
+            self.command = ["xclip", "-selection", "clipboard", "-t", "image/png", "-i"]
+            self.paste_command = ["xclip", "-selection", "clipboard", "-t", "image/png", "-o"]
+            self.targets_command = ["xclip", "-selection", "clipboard", "-t", "TARGETS", "-o"]
+        else:
+            raise RuntimeError("Neither wl-copy nor xclip is installed")
+        # bytes fetched by change_token, reused by the get_image call that follows it; b"" when there is no PNG
+        self.raw = None
+
+    def has_png(self) -> bool:
+        result = subprocess.run(self.targets_command, capture_output=True, timeout=5)
+        return result.returncode == 0 and b"image/png" in result.stdout.split()
+
+    def read_raw(self) -> bytes:
+        if not self.has_png():
+            return b""
+        result = subprocess.run(self.paste_command, capture_output=True, timeout=30)
+        return result.stdout if result.returncode == 0 else b""
+
+    @staticmethod
+    def token_of(raw: bytes) -> bytes:
+        # X11 and Wayland have no sequence number: hash the encoded bytes, which is far cheaper than decoding
+        return hashlib.blake2b(raw, digest_size=16).digest() if raw else NO_IMAGE
+
+    def change_token(self):
+        # the type list is asked for first, so a clipboard holding text costs no PNG read
+        self.raw = self.read_raw()
+        return self.token_of(self.raw)
+
+    def get_image(self) -> Optional[Image.Image]:
+        raw, self.raw = self.raw, None
+        if raw is None:
+            raw = self.read_raw()
+        if not raw:
+            return None
+        image = Image.open(BytesIO(raw))
+        image.load()
+        return image
+
+    def set_payload(self, payload: ClipboardPayload, on_published=None) -> bool:
+        return self.publish(payload.png, "image/png", on_published)
+
+    def set_encoded(self, data: bytes, format: str, on_published=None) -> bool:
+        return self.publish(lambda: data, self.encoded_formats[format], on_published)
+
+    def publish(self, encode, mime: str, on_published=None) -> bool:
+        def run():
+            try:
+                data = encode()
+                command = [mime if part == "image/png" else part for part in self.command]
+                subprocess.run(command, input=data, check=True, timeout=30)
+                if on_published:
+                    # change_token only reads PNG back; any other type looks like a clipboard without an image
+                    on_published(self.token_of(data) if mime == "image/png" else NO_IMAGE)
+            except Exception as e:
+                logging.error(f"Clipboard copy failed: {str(e)}")
+
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+
+class FakeClipboardBackend(ClipboardBackend):
+    """In-memory clipboard for tests and headless runs."""
+    encoded_formats = LinuxClipboardBackend.encoded_formats
+
+    def __init__(self):
+        self.image = None
+        self.payload = None
+        # (bytes, format) of the last encoded file copied
+        self.encoded = None
+        self.sequence_number = 0
+
+    def change_token(self):
+        return self.sequence_number
+
+    def get_image(self) -> Optional[Image.Image]:
+        return self.image
+
+    def set_payload(self, payload: ClipboardPayload, on_published=None) -> bool:
+        self.payload = payload
+        self.image = payload.image
+        self.encoded = None
+        self.sequence_number += 1
+        if on_published:
+            on_published(self.change_token())
+        return True
+
+    def set_encoded(self, data: bytes, format: str, on_published=None) -> bool:
+        self.payload = None
+        self.image = Image.open(BytesIO(data))
+        self.encoded = (data, format)
+        self.sequence_number += 1
+        if on_published:
+            on_published(self.change_token())
+        return True
+
+
+def default_backend() -> ClipboardBackend:
+    if sys.platform == "win32":
+        return WindowsClipboardBackend()
+    try:
+        return LinuxClipboardBackend()
+    except RuntimeError as e:
+        logging.warning(f"{e}; using an in-process clipboard")
+        return FakeClipboardBackend()
 
 
 class ClipboardManager:
     """Handles clipboard operations with error handling and format support."""
+    backend = None
+    last_token = None
+
+    @staticmethod
+    def get_backend() -> ClipboardBackend:
+        if ClipboardManager.backend is None:
+            ClipboardManager.backend = default_backend()
+        return ClipboardManager.backend
+
+    @staticmethod
+    def set_backend(backend: ClipboardBackend):
+        ClipboardManager.backend = backend
 
     @staticmethod
+    @timed("clipboard.changed")
+    def clipboard_changed() -> bool:
+        """True unless the clipboard provably holds what it held at the previous check."""
+        try:
+            token = ClipboardManager.get_backend().change_token()
+        except Exception as e:
+            logging.error(f"Clipboard change check failed: {str(e)}")
+            return True
+        changed = token is None or token != ClipboardManager.last_token
+        ClipboardManager.last_token = token
+        return changed
+
+    @staticmethod
+    def remember_token(token):
+        ClipboardManager.last_token = token
+
+    @staticmethod
+    @timed("clipboard.get")
     def get_image_from_clipboard() -> Optional[Image.Image]:
         try:
-            image = ImageGrab.grabclipboard()
+            image = ClipboardManager.get_backend().get_image()
             if isinstance(image, Image.Image):
                 logging.info("Image retrieved from clipboard")
-                return image.convert("RGB")
+                if getattr(image, "n_frames", 1) > 1:
+                    # an animated PNG/GIF/WebP is kept as opened, so its frames can still be read
+                    return image
+                with Profiler.span("clipboard.convert", image):
+                    return image.convert("RGB")
             logging.warning("Clipboard content is not an image")
             return None
         except Exception as e:
@@ -24,23 +355,35 @@ class ClipboardManager:
             return None
 
     @staticmethod
+    @timed("clipboard.copy")
     def copy_image_to_clipboard(image: Image.Image) -> bool:
         try:
-            output = BytesIO()
-            image.save(output, format="BMP")
-            data = output.getvalue()[14:]
-            output.close()
-
-            win32clipboard.OpenClipboard()
-            win32clipboard.EmptyClipboard()
-            win32clipboard.SetClipboardData(win32clipboard.CF_DIB, data)
-            win32clipboard.CloseClipboard()
+            # our own copy is not a change: showing the window must not load it back as a new image
+            success = ClipboardManager.get_backend().set_payload(ClipboardPayload(image),
+                                                                 ClipboardManager.remember_token)
             logging.info("Image copied to clipboard")
-            return True
+            return success
         except Exception as e:
             logging.error(f"Clipboard copy failed: {str(e)}")
-            try:
-                win32clipboard.CloseClipboard()
-            except Exception:
-                pass
             return False
+
+    @staticmethod
+    def takes_encoded(format: str) -> bool:
+        return format in ClipboardManager.get_backend().encoded_formats
+
+    @staticmethod
+    @timed("clipboard.copy")
+    def copy_encoded_to_clipboard(data: bytes, format: str) -> bool:
+        """Puts an already encoded file on the clipboard unchanged; see takes_encoded."""
+        try:
+            success = ClipboardManager.get_backend().set_encoded(data, format, ClipboardManager.remember_token)
+            logging.info(f"{format} file copied to clipboard")
+            return success
+        except Exception as e:
+            logging.error(f"Clipboard copy failed: {str(e)}")
+            return False
+
+    @staticmethod
+    def close():
+        if ClipboardManager.backend is not None:
+            ClipboardManager.backend.close()
@@ -0,0 +1,54 @@
+import logging
+import threading
+from collections import deque
+
+# net history step of each coalesced command
+HISTORY_STEPS = {'undo': -1, 'redo': 1}
+
+
+class CommandQueue:
+    """Hands events from hotkey, tray and IPC threads to the Tk loop.
+
+    post() may be called from any thread; it only queues the command and, if
+    no drain is pending, schedules one with after(). The drain runs every
+    queued command on the Tk thread. Undo and redo presses that arrive while
+    the loop is busy (auto-repeat during a render) are folded into a single
+    'history' command with the list of steps, so only the final state is shown.
+    """
+
+    def __init__(self, app, handlers: dict):
+        self.app = app
+        self.handlers = handlers
+        self.lock = threading.Lock()
+        self.pending = deque()
+        self.scheduled = False
+
+    def post(self, command: str, *args):
+        with self.lock:
+            if command in HISTORY_STEPS:
+                step = HISTORY_STEPS[command]
+                if self.pending and self.pending[-1][0] == 'history':
+                    self.pending[-1][1][0].append(step)
+                else:
+                    self.pending.append(('history', ([step],)))
+            else:
+                self.pending.append((command, args))
+            if self.scheduled:
+                return
+            self.scheduled = True
+        self.app.after(0, self.drain)
+
+    def poster(self, command: str, *args):
+        """A callback for hotkey and menu registrations that posts the command."""
+        return lambda *_: self.post(command, *args)
+
+    def drain(self):
+        with self.lock:
+            commands = list(self.pending)
+            self.pending.clear()
+            self.scheduled = False
+        for command, args in commands:
+            try:
+                self.handlers[command](*args)
+            except Exception as e:
+                logging.error(f"Command '{command}' failed: {str(e)}")
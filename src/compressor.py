@@ -0,0 +1,107 @@
+from io import BytesIO
+from typing import Optional
+from PIL import Image
+
+EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp", "PNG": ".png"}
+MIN_QUALITY = 5
+MAX_QUALITY = 95
+MIN_COLORS = 2
+MAX_COLORS = 256
+
+
+class CompressionResult:
+    """Encoded bytes plus the decoded image they produce."""
+
+    def __init__(self, data: bytes, format: str, quality: Optional[int] = None, colors: Optional[int] = None):
+        self.data = data
+        self.format = format
+        self.quality = quality
+        self.colors = colors
+        self.image = Image.open(BytesIO(data))
+        self.image.load()
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    @property
+    def extension(self) -> str:
+        return EXTENSIONS[self.format]
+
+    def describe(self) -> str:
+        if self.colors:
+            return f"{self.format}, {self.colors} colors"
+        return f"{self.format} q={self.quality}"
+
+
+class ImageCompressor:
+    """Finds the best encoding of one image that fits a byte budget.
+
+    Every encode attempt is memoized, so retrying with a different target
+    for the same image only encodes the qualities it has not tried yet.
+    """
+
+    def __init__(self, image: Image.Image):
+        self.image = image
+        self.attempts = {}
+        self.palettes = {}
+
+    def encode(self, format: str, quality: int = None, colors: int = None) -> bytes:
+        key = (format, quality, colors)
+        if key not in self.attempts:
+            image = self.quantized(colors) if colors else self.image
+            if format == "JPEG" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            output = BytesIO()
+            if format == "JPEG":
+                image.save(output, format, quality=quality, optimize=True)
+            elif format == "WEBP":
+                image.save(output, format, quality=quality, method=4)
+            else:
+                image.save(output, format, optimize=True)
+            self.attempts[key] = output.getvalue()
+        return self.attempts[key]
+
+    def quantized(self, colors: int) -> Image.Image:
+        if colors not in self.palettes:
+            image = self.image
+            if image.mode not in ("RGB", "RGBA", "L"):
+                image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+            method = Image.Quantize.FASTOCTREE if image.mode == "RGBA" else Image.Quantize.MEDIANCUT
+            self.palettes[colors] = image.quantize(colors, method=method)
+        return self.palettes[colors]
+
+    def search(self, low: int, high: int, fits) -> Optional[int]:
+        # largest value in [low, high] for which fits() holds, assuming it is monotonic
+        if fits(high):
+            return high
+        best = None
+        while low < high:
+            middle = (low + high) // 2
+            if fits(middle):
+                best, low = middle, middle + 1
+            else:
+                high = middle
+        return best
+
+    def compress(self, target_bytes: int = None, quality: int = None, format: str = "JPEG",
+                 quantize: bool = True) -> CompressionResult:
+        if format not in ("JPEG", "WEBP"):
+            raise ValueError(f"Unsupported format: {format}")
+        if quality is not None:
+            return CompressionResult(self.encode(format, quality), format, quality=quality)
+        if target_bytes is None or target_bytes <= 0:
+            raise ValueError("A positive target size or a quality is required")
+
+        found = self.search(MIN_QUALITY, MAX_QUALITY, lambda q: len(self.encode(format, q)) <= target_bytes)
+        if found is not None:
+            return CompressionResult(self.encode(format, found), format, quality=found)
+
+        if quantize:
+            colors = self.search(MIN_COLORS, MAX_COLORS, lambda c: len(self.encode("PNG", colors=c)) <= target_bytes)
+            if colors is not None:
+                return CompressionResult(self.encode("PNG", colors=colors), "PNG", colors=colors)
+
+        # nothing fits: hand back the smallest attempt so the caller can report how close it got
+        (format, quality, colors), data = min(self.attempts.items(), key=lambda item: len(item[1]))
+        return CompressionResult(data, format, quality=quality, colors=colors)
@@ -0,0 +1,310 @@
+import json
+import threading
+from collections import OrderedDict
+from PIL import Image
+from image_handle import ImageHandle
+from image_processor import ImageProcessor
+from point_ops import POINT_OPERATIONS, adjustment_of, validate_adjustment
+
+OPERATIONS = ("scale", "resize", "grayscale", "lower_quality", "pixelate", "revert") + POINT_OPERATIONS
+# operations that may carry a "box" and then only change that rectangle
+REGION_OPERATIONS = ("grayscale", "lower_quality", "pixelate") + POINT_OPERATIONS
+# modes a region patch can be pasted back into without changing the image's mode
+REGION_MODES = ("L", "LA", "RGB", "RGBA")
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
+
+def validate_operation(operation: dict) -> dict:
+    name = operation.get("op")
+    if name not in OPERATIONS:
+        raise ValueError(f"Unknown operation: {name!r}")
+    if name == "scale" and float(operation["factor"]) <= 0:
+        raise ValueError("Scale factor must be positive")
+    if name == "resize" and (int(operation["width"]) <= 0 or int(operation["height"]) <= 0):
+        raise ValueError("Dimensions must be positive integers")
+    if name == "pixelate" and int(operation["block"]) < 1:
+        raise ValueError("Pixelate block must be at least 1 pixel")
+    if name in POINT_OPERATIONS:
+        validate_adjustment(operation)
+    if operation.get("box") is not None:
+        if name not in REGION_OPERATIONS:
+            raise ValueError(f"{name} cannot be applied to a region")
+        left, top, right, bottom = (int(value) for value in operation["box"])
+        if left < 0 or top < 0 or right <= left or bottom <= top:
+            raise ValueError("Region must be a non-empty box")
+    return operation
+
+
+def build_plan(size: tuple, mode: str, operations: list) -> tuple:
+    """Turns recorded operations into the minimal sequence of steps to run.
+
+    Scales become resizes to absolute sizes, runs of resizes collapse into a
+    single resample, and grayscale is hoisted in front of the resizes it
+    follows so they work on one channel instead of three. lower_quality depends
+    on the pixels at the size it sees, so nothing is moved across it.
+    Consecutive point adjustments, and a grayscale next to them, fuse into one
+    ("point", adjustments) step; they do not commute with resampling, so they
+    end a run of resizes like lower_quality does.
+    Operations with a box become ("region", box, steps): the box is clipped to
+    the image, consecutive operations on the same box share one region step,
+    and nothing is moved across it.
+    """
+    original_size, original_gray = size, mode == "L"
+    steps = []
+    run_start = 0  # index in steps where the trailing run of resizes begins
+    run_size = size  # image size before that run
+    gray = original_gray
+    region = None  # last region step and the operations it was planned from
+
+    for operation in operations:
+        name = operation["op"]
+        if operation.get("box") is not None:
+            left, top, right, bottom = (int(value) for value in operation["box"])
+            box = (max(0, left), max(0, top), min(size[0], right), min(size[1], bottom))
+            if box[0] >= box[2] or box[1] >= box[3]:
+                continue
+            inner = {key: value for key, value in operation.items() if key != "box"}
+            if region is not None and steps and steps[-1] is region[0] and region[0][1] == box:
+                steps.pop()
+                region_operations = region[1] + [inner]
+            else:
+                region_operations = [inner]
+            region = None
+            region_steps = build_plan((box[2] - box[0], box[3] - box[1]), "L" if gray else "RGB", region_operations)
+            if region_steps:
+                region = (("region", box, region_steps), region_operations)
+                steps.append(region[0])
+            run_start, run_size = len(steps), size
+        elif name == "revert":
+            steps, run_start, run_size, size, gray = [], 0, original_size, original_size, original_gray
+        elif name in ("scale", "resize"):
+            if name == "scale":
+                factor = float(operation["factor"])
+                new_size = (max(1, int(size[0] * factor)), max(1, int(size[1] * factor)))
+            else:
+                new_size = (int(operation["width"]), int(operation["height"]))
+            del steps[run_start:]
+            if new_size != run_size:
+                steps.append(("resize",) + new_size)
+            size = new_size
+        elif name == "grayscale":
+            if gray:
+                continue
+            if run_start > 0 and steps[run_start - 1][0] == "point":
+                steps[run_start - 1] = ("point", steps[run_start - 1][1] + (("grayscale",),))
+            else:
+                steps.insert(run_start, ("grayscale",))
+                run_start += 1
+            gray = True
+        elif name in POINT_OPERATIONS:
+            adjustment = adjustment_of(operation)
+            last = steps[-1] if steps else None
+            if last == ("grayscale",):
+                steps[-1] = ("point", (("grayscale",), adjustment))
+            elif last is not None and last[0] == "point":
+                steps[-1] = ("point", last[1] + (adjustment,))
+            else:
+                steps.append(("point", (adjustment,)))
+            run_start, run_size = len(steps), size
+        elif name == "lower_quality":
+            steps.append(("lower_quality",))
+            run_start, run_size = len(steps), size
+        elif name == "pixelate":
+            steps.append(("pixelate", int(operation["block"])))
+            run_start, run_size = len(steps), size
+    return tuple(steps)
+
+
+def apply_step(image: Image.Image, step: tuple) -> Image.Image:
+    name = step[0]
+    if name == "resize":
+        return ImageProcessor.resize(image, step[1], step[2])
+    if name == "grayscale":
+        return ImageProcessor.to_grayscale(image)
+    if name == "lower_quality":
+        return ImageProcessor.lower_quality(image)
+    if name == "point":
+        return ImageProcessor.adjust(image, step[1])
+    if name == "pixelate":
+        return ImageProcessor.pixelate(image, step[1])
+    if name == "region":
+        return apply_region(image, step[1], step[2])[0]
+    raise ValueError(f"Unknown step: {name!r}")
+
+
+def editable_copy(image: Image.Image) -> Image.Image:
+    """A new image with the same pixels that region patches can be pasted into."""
+    if image.mode in REGION_MODES:
+        return image.copy()
+    return image.convert("RGBA" if "transparency" in image.info or "A" in image.getbands() else "RGB")
+
+
+def apply_region(image: Image.Image, box: tuple, steps: tuple) -> tuple:
+    """Runs steps on the box of image only; returns the whole result and the changed patch."""
+    canvas = editable_copy(image)
+    crop = canvas.crop(box)
+    patch = crop
+    for step in steps:
+        patch = apply_step(patch, step)
+    if patch.mode != canvas.mode:
+        # e.g. a grayscale region of a color image: back to color, keeping the region's transparency
+        patch = patch.convert(canvas.mode)
+        if "A" in canvas.getbands():
+            patch.putalpha(crop.getchannel("A"))
+    canvas.paste(patch, box[:2])
+    return canvas, patch
+
+
+class RegionPatch(ImageHandle):
+    """Cache entry for a region step: only the changed pixels and where they go."""
+
+    def __init__(self, patch: Image.Image, box: tuple):
+        super().__init__(patch, "pipeline patch")
+        self.box = box
+
+
+class EditPipeline:
+    """Recorded edits on one image, evaluated lazily from the original.
+
+    Undo, redo and revert only move a pointer through the operation list;
+    intermediate results are kept in an LRU cache keyed by plan prefix, so
+    returning to a state that was already rendered costs nothing.
+    Region steps cache only their patch; the full image of a state ending in
+    patches is rebuilt by pasting them onto the nearest full entry, and only
+    the latest such image is kept whole.
+    render() may be called from worker threads.
+    """
+
+    def __init__(self, original: Image.Image, operations: list = None, cache_bytes: int = DEFAULT_CACHE_BYTES):
+        self.original = original
+        self.operations = [validate_operation(dict(op)) for op in operations or []]
+        self.position = len(self.operations)
+        self.cache_bytes = cache_bytes
+        self.cache = OrderedDict()
+        # (plan, handle) of the last state rebuilt from patches
+        self.latest = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_json(cls, original: Image.Image, text: str) -> "EditPipeline":
+        return cls(original, json.loads(text))
+
+    def to_json(self) -> str:
+        return json.dumps(self.applied())
+
+    def push(self, operation: dict):
+        del self.operations[self.position:]
+        self.operations.append(validate_operation(operation))
+        self.position += 1
+
+    def undo(self) -> bool:
+        if self.position == 0:
+            return False
+        self.position -= 1
+        return True
+
+    def redo(self) -> bool:
+        if self.position == len(self.operations):
+            return False
+        self.position += 1
+        return True
+
+    def applied(self) -> list:
+        return self.operations[:self.position]
+
+    def plan(self, extra: list = ()) -> tuple:
+        return build_plan(self.original.size, self.original.mode, self.applied() + list(extra))
+
+    def has_edits(self) -> bool:
+        return bool(self.plan())
+
+    def cached(self, plan: tuple):
+        if not plan:
+            return self.original
+        with self.lock:
+            return self.materialize(plan)
+
+    def materialize(self, plan: tuple):
+        # the cached image for plan, pasting patches onto the nearest full entry; None if a link is missing
+        patches = []
+        end = len(plan)
+        base = self.original
+        while end > 0:
+            prefix = plan[:end]
+            if self.latest is not None and self.latest[0] == prefix:
+                base = self.latest[1].image
+                break
+            entry = self.cache.get(prefix)
+            if entry is None:
+                return None
+            self.cache.move_to_end(prefix)
+            if not isinstance(entry, RegionPatch):
+                base = entry.image
+                break
+            patches.append(entry)
+            end -= 1
+        if not patches:
+            return base
+
+        image = editable_copy(base)
+        for patch in reversed(patches):
+            image.paste(patch.image, patch.box[:2])
+        self.set_latest(plan, image)
+        return image
+
+    def render(self, plan: tuple = None) -> Image.Image:
+        if plan is None:
+            plan = self.plan()
+
+        # resume from the longest prefix that is already rendered
+        image, start = self.original, 0
+        with self.lock:
+            for end in range(len(plan), 0, -1):
+                if (cached := self.materialize(plan[:end])) is not None:
+                    image, start = cached, end
+                    break
+
+        for end in range(start + 1, len(plan) + 1):
+            step = plan[end - 1]
+            if step[0] == "region":
+                image, patch = apply_region(image, step[1], step[2])
+                self.store_patch(plan[:end], patch, step[1], image)
+            else:
+                image = apply_step(image, step)
+                self.store(plan[:end], image)
+        return image
+
+    def store(self, plan: tuple, image: Image.Image):
+        with self.lock:
+            self.cache[plan] = ImageHandle(image, "pipeline cache")
+            self.cache.move_to_end(plan)
+            self.enforce_budget()
+
+    def store_patch(self, plan: tuple, patch: Image.Image, box: tuple, image: Image.Image):
+        with self.lock:
+            self.cache[plan] = RegionPatch(patch, box)
+            self.cache.move_to_end(plan)
+            self.set_latest(plan, image)
+            self.enforce_budget()
+
+    def set_latest(self, plan: tuple, image: Image.Image):
+        if self.latest is not None:
+            self.latest[1].release()
+        self.latest = (plan, ImageHandle(image, "pipeline render"))
+
+    def enforce_budget(self):
+        total = sum(ImageProcessor.nbytes(handle.image) for handle in self.handles())
+        while total > self.cache_bytes and len(self.cache) > 1:
+            _, evicted = self.cache.popitem(last=False)
+            total -= ImageProcessor.nbytes(evicted.image)
+            evicted.release()
+
+    def handles(self) -> list:
+        return list(self.cache.values()) + ([self.latest[1]] if self.latest is not None else [])
+
+    def clear_cache(self):
+        with self.lock:
+            for handle in self.handles():
+                handle.release()
+            self.cache.clear()
+            self.latest = None
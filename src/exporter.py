@@ -0,0 +1,151 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from typing import Optional
+from PIL import Image
+from animation import ANIMATED_FORMATS, Animation, render_frame
+from edit_pipeline import build_plan
+from image_processor import ImageProcessor
+
+EXPORT_FORMATS = ("PNG", "JPEG", "WEBP", "GIF")
+EXTENSIONS = {"PNG": ".png", "JPEG": ".jpg", "WEBP": ".webp", "GIF": ".gif"}
+DEFAULT_OPTIONS = {
+    "PNG": {"compress_level": 6, "optimize": False},
+    "JPEG": {"quality": 90, "progressive": True, "subsampling": 0},
+    "WEBP": {"lossless": False, "quality": 90, "method": 4, "minimize_size": False},
+    "GIF": {"optimize": True},
+}
+# the values each option may take; anything else is dropped with a warning
+OPTION_TYPES = {
+    "compress_level": int, "optimize": bool, "quality": int, "progressive": bool,
+    "subsampling": int, "lossless": bool, "method": int, "minimize_size": bool,
+}
+# frames handed to the frame pool ahead of the encoder, per worker
+FRAMES_IN_FLIGHT = 2
+
+
+def format_for(path: str) -> Optional[str]:
+    return Image.registered_extensions().get(os.path.splitext(path)[1].lower())
+
+
+def merged_options(format: str, options: dict = None) -> dict:
+    merged = dict(DEFAULT_OPTIONS.get(format, {}))
+    for name, value in (options or {}).items():
+        if name not in merged:
+            logging.warning(f"Ignoring unknown {format} option: {name}")
+            continue
+        merged[name] = OPTION_TYPES[name](value)
+    return merged
+
+
+class ExportTarget:
+    """One file to write: where, in which format and encoder options, and at what scale."""
+
+    def __init__(self, path: str, format: str = None, options: dict = None, scale: float = 1.0):
+        self.path = path
+        self.format = format or format_for(path) or "PNG"
+        self.options = merged_options(self.format, options)
+        self.scale = scale
+
+
+class ExportResult:
+    def __init__(self, target: ExportTarget, size: int = 0, seconds: float = 0.0, error: Exception = None):
+        self.target = target
+        self.size = size
+        self.seconds = seconds
+        self.error = error
+
+    def describe(self) -> str:
+        name = os.path.basename(self.target.path)
+        if self.error is not None:
+            return f"{name} failed"
+        return f"{name} {self.size / 1024:.0f} KB in {self.seconds:.2f}s"
+
+
+class Exporter:
+    """Writes one image to several targets, encoding them in parallel.
+
+    Pillow releases the GIL while encoding, so a thread per target runs the
+    PNG, JPEG and WebP encoders side by side. Each scaled size is resampled
+    once and shared by every target that asks for it. Files are written next
+    to their destination and renamed into place.
+    Animations are written one target at a time instead, their frames
+    processed in parallel by a process pool started on first use.
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or min(4, os.cpu_count() or 1), thread_name_prefix="export-worker"
+        )
+        self.frame_executor = None
+
+    @staticmethod
+    def prepare(image: Image.Image, format: str) -> Image.Image:
+        if format == "JPEG" and image.mode not in ("RGB", "L"):
+            return image.convert("RGB")
+        if format == "PNG" and image.mode not in ("1", "L", "LA", "P", "RGB", "RGBA", "I", "I;16"):
+            return image.convert("RGBA")
+        return image
+
+    @staticmethod
+    def encode(image: Image.Image, target: ExportTarget) -> bytes:
+        output = BytesIO()
+        Exporter.prepare(image, target.format).save(output, target.format, **target.options)
+        return output.getvalue()
+
+    @staticmethod
+    def write(image: Image.Image, target: ExportTarget) -> ExportResult:
+        start = time.perf_counter()
+        temporary = target.path + ".part"
+        try:
+            data = Exporter.encode(image, target)
+            with open(temporary, "wb") as f:
+                f.write(data)
+            os.replace(temporary, target.path)
+        except Exception as e:
+            logging.error(f"Export to {target.path} failed: {str(e)}")
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            return ExportResult(target, error=e)
+        return ExportResult(target, len(data), time.perf_counter() - start)
+
+    def export(self, image: Image.Image, targets: list) -> list:
+        scaled = {1.0: image}
+        for target in targets:
+            if target.scale not in scaled:
+                scaled[target.scale] = ImageProcessor.scale(image, target.scale)
+        futures = [self.executor.submit(Exporter.write, scaled[target.scale], target) for target in targets]
+        return [future.result() for future in futures]
+
+    def write_animation(self, animation: Animation, operations: list, target: ExportTarget) -> ExportResult:
+        operations = operations + ([{"op": "scale", "factor": target.scale}] if target.scale != 1.0 else [])
+        if target.format not in ANIMATED_FORMATS:
+            # formats without animation get the first frame
+            first = next(animation.frames())
+            return Exporter.write(render_frame(first, build_plan(animation.size, animation.mode, operations)), target)
+
+        start = time.perf_counter()
+        temporary = target.path + ".part"
+        try:
+            if self.frame_executor is None:
+                self.frame_executor = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+            with open(temporary, "wb") as f:
+                animation.save(f, target.format, operations, target.options, self.frame_executor,
+                               FRAMES_IN_FLIGHT * (os.cpu_count() or 1))
+            os.replace(temporary, target.path)
+        except Exception as e:
+            logging.error(f"Export to {target.path} failed: {str(e)}")
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            return ExportResult(target, error=e)
+        return ExportResult(target, os.path.getsize(target.path), time.perf_counter() - start)
+
+    def export_animation(self, animation: Animation, operations: list, targets: list) -> list:
+        return [self.write_animation(animation, operations, target) for target in targets]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.frame_executor is not None:
+            self.frame_executor.shutdown(wait=False, cancel_futures=True)
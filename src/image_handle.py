@@ -0,0 +1,59 @@
+import threading
+import weakref
+from collections import Counter
+from PIL import Image
+from image_processor import ImageProcessor
+
+
+class ImageHandle:
+    """A reference to decoded pixels that may be shared by several owners.
+
+    Images behind handles are never changed in place; every edit, and every
+    region paste, writes to a new image. That is what makes share(), another
+    reference to the same pixels, safe. Every live handle is tracked, so
+    memory_usage() can tell how many distinct buffers are really held.
+    """
+    live = weakref.WeakSet()
+    # handles are made on worker threads while the Tk thread reads memory_usage()
+    lock = threading.Lock()
+
+    def __init__(self, image: Image.Image, owner: str = ""):
+        self._image = image
+        self.owner = owner
+        with ImageHandle.lock:
+            ImageHandle.live.add(self)
+
+    @property
+    def image(self) -> Image.Image:
+        return self._image
+
+    @property
+    def size(self) -> tuple:
+        return self._image.size
+
+    @property
+    def mode(self) -> str:
+        return self._image.mode
+
+    def share(self, owner: str = None) -> "ImageHandle":
+        return ImageHandle(self._image, owner if owner is not None else self.owner)
+
+    def release(self):
+        with ImageHandle.lock:
+            ImageHandle.live.discard(self)
+        self._image = None
+
+    @staticmethod
+    def memory_usage() -> dict:
+        with ImageHandle.lock:
+            handles = [handle for handle in list(ImageHandle.live) if handle._image is not None]
+        unique = {id(handle._image): handle._image for handle in handles}
+        owners = Counter(handle.owner for handle in handles)
+        return {
+            "handles": len(handles),
+            "unique_buffers": len(unique),
+            "bytes": sum(ImageProcessor.nbytes(image) for image in unique.values()),
+            # what the same states would cost if every owner held its own copy
+            "unshared_bytes": sum(ImageProcessor.nbytes(handle._image) for handle in handles),
+            "owners": dict(owners),
+        }
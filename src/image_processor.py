@@ -1,25 +1,96 @@
+import threading
+from io import BytesIO
 from PIL import Image, ImageOps
+from point_ops import apply_adjustments
+from profiler import timed
+
+LOW_QUALITY = 25
+PIXELATE_BLOCK = 16
+# Pillow's pixel limit is a global; openers that lift it take turns
+PIXEL_LIMIT_LOCK = threading.Lock()
 
 
 class ImageProcessor:
     """Image processing operations."""
     @staticmethod
+    def nbytes(image: Image.Image) -> int:
+        bits = {"1": 1, "I;16": 16, "I": 32, "F": 32}.get(image.mode, 8 * len(image.getbands()))
+        return image.width * image.height * bits // 8
+
+    @staticmethod
+    def open_unbounded(source) -> Image.Image:
+        """Image.open without Pillow's decompression-bomb pixel limit.
+
+        Only for paths built for huge images, which bound their own memory
+        (strip processing, drafts); everything else keeps the limit.
+        """
+        with PIXEL_LIMIT_LOCK:
+            limit, Image.MAX_IMAGE_PIXELS = Image.MAX_IMAGE_PIXELS, None
+            try:
+                return Image.open(source)
+            finally:
+                Image.MAX_IMAGE_PIXELS = limit
+
+    @staticmethod
+    def fit_size(width: int, height: int, box: tuple) -> tuple:
+        # largest size with the same aspect ratio that fits inside box, never upscaled
+        ratio = min(1.0, box[0] / width, box[1] / height)
+        return max(1, int(width * ratio)), max(1, int(height * ratio))
+
+    @staticmethod
+    @timed("image.thumbnail")
+    def thumbnail(image: Image.Image, box: tuple) -> Image.Image:
+        # like Image.thumbnail, but returns a new image instead of copying the source first
+        size = ImageProcessor.fit_size(image.width, image.height, box)
+        if size == image.size:
+            return image.copy()
+        return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    @staticmethod
+    @timed("image.scale")
     def scale(image: Image.Image, scale_factor: float) -> Image.Image:
         new_size = (int(image.width * scale_factor), int(image.height * scale_factor))
         return image.resize(new_size, Image.Resampling.LANCZOS)
 
     @staticmethod
+    @timed("image.resize")
     def resize(image: Image.Image, width: int, height: int) -> Image.Image:
         if width <= 0 or height <= 0:
             raise ValueError("Dimensions must be positive integers")
         return image.resize((width, height), Image.Resampling.LANCZOS)
 
     @staticmethod
+    @timed("image.to_grayscale")
     def to_grayscale(image: Image.Image) -> Image.Image:
         return ImageOps.grayscale(image)
 
     @staticmethod
-    def lower_quality(image: Image.Image) -> Image.Image:
-        w, h = image.size
-        temp = image.resize((max(1, w // 3), max(1, h // 3)), Image.Resampling.LANCZOS)
-        return temp.resize((w, h), Image.Resampling.LANCZOS)
+    @timed("image.adjust")
+    def adjust(image: Image.Image, adjustments) -> Image.Image:
+        # any chain of brightness/contrast/gamma/levels/invert/grayscale, fused into lookup tables
+        return apply_adjustments(image, adjustments)
+
+    @staticmethod
+    @timed("image.pixelate")
+    def pixelate(image: Image.Image, block: int = PIXELATE_BLOCK) -> Image.Image:
+        # average each block x block cell (partial cells at the edges too), then blow them back up with hard edges
+        if image.mode in ("1", "P"):
+            image = image.convert("RGBA")
+        cells = image.reduce(block) if block > 1 else image
+        return cells.resize((cells.width * block, cells.height * block), Image.Resampling.NEAREST).crop(
+            (0, 0, image.width, image.height))
+
+    @staticmethod
+    @timed("image.lower_quality")
+    def lower_quality(image: Image.Image, quality: int = LOW_QUALITY) -> Image.Image:
+        # a single JPEG round trip; 4:4:4 sampling keeps every 8x8 block independent
+        source = image if image.mode in ("RGB", "L") else image.convert("RGB")
+        output = BytesIO()
+        source.save(output, format="JPEG", quality=quality, subsampling=0)
+        output.seek(0)
+        result = Image.open(output)
+        result.load()
+        if "A" in image.getbands():
+            result = result.convert(image.mode)
+            result.putalpha(image.getchannel("A"))
+        return result
@@ -0,0 +1,100 @@
+import base64
+import http.client
+import json
+import os
+from urllib.parse import urlencode
+from settings import SETTINGS_FILE, SettingsManager
+
+DEFAULT_PORT = 47321
+TOKEN_FILE = os.path.join(os.path.dirname(SETTINGS_FILE), 'ipc_token')
+TOKEN_HEADER = 'X-QuickImgEditor-Token'
+CONNECT_TIMEOUT = 0.5
+
+
+def read_token():
+    try:
+        with open(TOKEN_FILE, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+class IpcClient:
+    """Talks to the QuickImgEditor instance running on this machine.
+
+    Only uses the standard library, so a second launch can forward to the
+    running instance without importing the GUI or Pillow first.
+    """
+
+    def __init__(self, port: int = None, token: str = None, timeout: float = 60):
+        self.port = port or SettingsManager.load().get('ipc_port', DEFAULT_PORT)
+        self.token = token or read_token()
+        self.timeout = timeout
+
+    def request(self, method: str, path: str, body: bytes = None, content_type: str = 'application/json',
+                timeout: float = None) -> tuple:
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=timeout or self.timeout)
+        try:
+            headers = {TOKEN_HEADER: self.token or '', 'Content-Type': content_type}
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+        finally:
+            connection.close()
+        if response.status != 200:
+            message = json.loads(data).get('error', data.decode()) if data.startswith(b'{') else data.decode()
+            raise RuntimeError(f"QuickImgEditor returned {response.status}: {message}")
+        return data, response.getheader('Content-Type', '')
+
+    def call(self, path: str, payload: dict = None):
+        data, _ = self.request('POST' if payload is not None else 'GET', path,
+                               json.dumps(payload).encode() if payload is not None else None)
+        return json.loads(data)
+
+    def ping(self) -> dict:
+        data, _ = self.request('GET', '/ping', timeout=CONNECT_TIMEOUT)
+        return json.loads(data)
+
+    def process_file(self, source: str, operations: list, destination: str = None, format: str = 'png'):
+        """Writes the result to destination and returns a summary; without one, returns the encoded bytes."""
+        job = {'input': os.path.abspath(source), 'operations': operations}
+        if destination:
+            job['output'] = os.path.abspath(destination)
+        else:
+            job['format'] = format
+        return self.decoded(self.call('/process', job))
+
+    def process_bytes(self, data: bytes, operations: list, format: str = 'png') -> bytes:
+        # operations in batch syntax, e.g. ['scale=0.5', 'grayscale']
+        query = urlencode([('op', op) for op in operations] + [('format', format)])
+        result, _ = self.request('POST', f'/process?{query}', data, 'application/octet-stream')
+        return result
+
+    def process_many(self, jobs: list) -> list:
+        # jobs may carry image bytes as 'data'; results without an output file come back as bytes
+        jobs = [dict(job, data=base64.b64encode(job['data']).decode('ascii')) if isinstance(job.get('data'), bytes)
+                else job for job in jobs]
+        return [self.decoded(result) for result in self.call('/batch', {'jobs': jobs})['results']]
+
+    @staticmethod
+    def decoded(result):
+        if isinstance(result, dict) and isinstance(result.get('data'), str):
+            return base64.b64decode(result['data'])
+        return result
+
+
+def forward_to_running_instance(args: list) -> bool:
+    """Hands a launch over to an instance that is already running; False if there is none."""
+    client = IpcClient()
+    if client.token is None:
+        return False
+    try:
+        client.ping()
+        paths = [os.path.abspath(arg) for arg in args if os.path.isfile(arg)]
+        if paths:
+            client.call('/open', {'paths': paths})
+        else:
+            client.call('/show', {})
+        return True
+    except (OSError, RuntimeError, ValueError):
+        return False
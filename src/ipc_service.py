@@ -0,0 +1,204 @@
+import base64
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlparse
+from PIL import Image
+from batch import parse_operation, process_file
+from edit_pipeline import EditPipeline, validate_operation
+from exporter import Exporter
+from ipc_client import TOKEN_FILE, TOKEN_HEADER
+
+MAX_BODY_BYTES = 512 * 1024 * 1024
+
+
+def image_format(name: str) -> str:
+    # 'jpg', 'png', 'webp'... as Pillow names the format
+    return Image.registered_extensions().get('.' + name.lower(), name.upper())
+
+
+def run_job(job: dict):
+    """Applies a recipe to an image given as bytes or a path; returns encoded bytes or a summary."""
+    # operations are recorded dicts or batch syntax strings such as 'scale=0.5'
+    operations = [validate_operation(parse_operation(op) if isinstance(op, str) else dict(op))
+                  for op in job.get('operations', [])]
+    source = BytesIO(job['data']) if job.get('data') is not None else job['input']
+
+    output = job.get('output')
+    if output is not None:
+        # the same read, edit and rename-into-place as batch mode
+        _, bytes_out, _ = process_file(source, output, operations)
+        with Image.open(output) as result:
+            return {'output': output, 'size': list(result.size), 'bytes': bytes_out}
+
+    with Image.open(source) as image:
+        result = EditPipeline(image, operations, cache_bytes=0).render()
+        # with no operations the result is the opened file itself, which must be read before it closes
+        result.load()
+    format = image_format(job.get('format', 'png'))
+    encoded = BytesIO()
+    Exporter.prepare(result, format).save(encoded, format)
+    return encoded.getvalue()
+
+
+def json_job(job: dict) -> dict:
+    # JSON has no bytes: image data in a JSON job is base64
+    if isinstance(job.get('data'), str):
+        job = dict(job, data=base64.b64decode(job['data']))
+    return job
+
+
+def json_result(result, job: dict):
+    # an encoded image in a JSON reply goes back as base64, with the format it is in
+    if isinstance(result, bytes):
+        return {'data': base64.b64encode(result).decode('ascii'), 'format': image_format(job.get('format', 'png'))}
+    return result
+
+
+class ProcessingService:
+    """Runs IPC jobs on a thread pool, one task per job, so a burst of requests runs in parallel."""
+
+    def __init__(self, max_workers: int = None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1,
+                                           thread_name_prefix="ipc-worker")
+
+    def submit(self, job: dict) -> Future:
+        return self.executor.submit(run_job, job)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class IpcRequestHandler(BaseHTTPRequestHandler):
+    server_version = "QuickImgEditor"
+
+    def log_message(self, format, *args):
+        logging.debug(f"IPC {self.address_string()}: {format % args}")
+
+    def send_json(self, status: int, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def authorized(self) -> bool:
+        token = self.headers.get(TOKEN_HEADER, '')
+        if hmac.compare_digest(token, self.server.token):
+            return True
+        self.send_json(403, {'error': 'missing or wrong token'})
+        return False
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length', 0))
+        if length > MAX_BODY_BYTES:
+            raise ValueError('request too large')
+        return self.rfile.read(length)
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        if urlparse(self.path).path == '/ping':
+            self.send_json(200, {'app': 'QuickImgEditor', 'pid': os.getpid(), 'processing': self.server.processing})
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if not self.authorized():
+            return
+        url = urlparse(self.path)
+        try:
+            body = self.read_body()
+            if url.path == '/show':
+                self.server.on_show()
+                self.send_json(200, {'ok': True})
+            elif url.path == '/open':
+                self.server.on_open(json.loads(body)['paths'])
+                self.send_json(200, {'ok': True})
+            elif url.path in ('/process', '/batch') and not self.server.processing:
+                self.send_json(403, {'error': 'image processing over IPC is turned off in the options'})
+            elif url.path == '/process':
+                self.process(url, body)
+            elif url.path == '/batch':
+                jobs = [json_job(job) for job in json.loads(body)['jobs']]
+                futures = [self.server.service.submit(job) for job in jobs]
+                results = []
+                for job, future in zip(jobs, futures):
+                    try:
+                        results.append(json_result(future.result(), job))
+                    except Exception as e:
+                        results.append({'error': str(e)})
+                self.send_json(200, {'results': results})
+            else:
+                self.send_json(404, {'error': 'not found'})
+        except (KeyError, ValueError, OSError) as e:
+            self.send_json(400, {'error': str(e)})
+        except Exception as e:
+            logging.error(f"IPC request failed: {str(e)}")
+            self.send_json(500, {'error': str(e)})
+
+    def process(self, url, body: bytes):
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            job = json_job(json.loads(body))
+            self.send_json(200, json_result(self.server.service.submit(job).result(), job))
+            return
+        # raw image bytes in, encoded image bytes out; operations in batch syntax as ?op= parameters
+        query = parse_qs(url.query)
+        job = {
+            'data': body,
+            'operations': [parse_operation(op) for op in query.get('op', [])],
+            'format': image_format(query.get('format', ['png'])[0]),
+        }
+        data = self.server.service.submit(job).result()
+        self.send_response(200)
+        self.send_header('Content-Type', Image.MIME.get(job['format'].upper(), 'application/octet-stream'))
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class IpcServer(ThreadingHTTPServer):
+    """Loopback HTTP endpoint of the running editor.
+
+    /show and /open let a second launch hand over to this instance; /process
+    and /batch run recipes for other local tools when processing is enabled.
+    Every request must carry the token written to TOKEN_FILE at start, which
+    only the current user can read.
+    """
+    daemon_threads = True
+
+    def __init__(self, port: int, on_show, on_open, processing: bool = False):
+        super().__init__(('127.0.0.1', port), IpcRequestHandler)
+        self.on_show = on_show
+        self.on_open = on_open
+        self.processing = processing
+        self.service = ProcessingService()
+        self.token = secrets.token_hex(16)
+        self.thread = None
+
+    def write_token(self):
+        os.makedirs(os.path.dirname(TOKEN_FILE), exist_ok=True)
+        fd = os.open(TOKEN_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(self.token)
+
+    def start(self):
+        self.write_token()
+        self.thread = threading.Thread(target=self.serve_forever, name="ipc-server", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.service.shutdown()
+        try:
+            os.remove(TOKEN_FILE)
+        except OSError:
+            pass
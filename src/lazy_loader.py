@@ -0,0 +1,125 @@
+import mmap
+from typing import Optional
+from PIL import Image
+from image_processor import ImageProcessor
+from profiler import timed
+
+# files with more pixels than this open from a draft, with the full decode in the background
+LAZY_PIXELS = 4 * 1024 * 1024
+ORIENTATION_TAG = 0x0112
+TRANSPOSES = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT, 3: Image.Transpose.ROTATE_180, 4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE, 6: Image.Transpose.ROTATE_270, 7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+# bytes per pixel of the raw layouts that can be read straight out of a mapped file
+RAW_PIXEL_BYTES = {
+    "L": 1, "P": 1, "RGB": 3, "BGR": 3, "RGBA": 4, "RGBX": 4, "BGRA": 4, "BGRX": 4, "CMYK": 4,
+    "I;16": 2, "I;16L": 2, "I;16B": 2,
+}
+
+
+class LazyImage:
+    """An image file opened from its header, decoded only as far as it is needed.
+
+    The header gives the size, mode and EXIF orientation without decoding
+    anything. draft() makes a preview-sized image cheaply: JPEGs decode at
+    1/2 to 1/8 scale through the DCT, and uncompressed BMP/PPM/TIFF files are
+    sampled row by row out of a memory map. load() decodes the full image,
+    from a memory map for uncompressed files, so its pixels are not first
+    read into a bytes copy; the result never refers to the file afterwards.
+    Both results are turned upright.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # files this large are exactly what the drafts and mapped loads are for
+        with ImageProcessor.open_unbounded(path) as image:
+            self.format = image.format
+            self.mode = image.mode
+            self.stored_size = image.size
+            self.palette = image.palette.copy() if image.mode == "P" and image.palette else None
+            self.n_frames = getattr(image, "n_frames", 1)
+            self.orientation = image.getexif().get(ORIENTATION_TAG, 1)
+            self.layout = self.raw_layout(image)
+        width, height = self.stored_size
+        self.size = (height, width) if self.orientation in (5, 6, 7, 8) else (width, height)
+
+    @staticmethod
+    def raw_layout(image: Image.Image) -> Optional[tuple]:
+        # (rawmode, stride, ystep, offset) when the pixels sit uncompressed and contiguous in the file
+        tiles = image.tile
+        if not tiles or any(tile[0] != "raw" or tile[1][0] != 0 or tile[1][2] != image.width for tile in tiles):
+            return None
+        args = (tiles[0][3],) if isinstance(tiles[0][3], str) else tuple(tiles[0][3])
+        rawmode, stride, ystep = (args + (0, 1))[:3]
+        if rawmode not in RAW_PIXEL_BYTES:
+            return None
+        stride = stride or image.width * RAW_PIXEL_BYTES[rawmode]
+        offset = tiles[0][2]
+        # TIFF strips: fine as long as each one starts where the previous ended
+        for previous, tile in zip(tiles, tiles[1:]):
+            if tile[3] != tiles[0][3] or tile[2] != previous[2] + (previous[1][3] - previous[1][1]) * stride:
+                return None
+        if ystep not in (1, -1) or tiles[-1][1][3] != image.height:
+            return None
+        return rawmode, stride, ystep, offset
+
+    def is_large(self) -> bool:
+        return self.stored_size[0] * self.stored_size[1] > LAZY_PIXELS and self.n_frames == 1
+
+    def upright(self, image: Image.Image) -> Image.Image:
+        method = TRANSPOSES.get(self.orientation)
+        return image.transpose(method) if method is not None else image
+
+    def with_palette(self, image: Image.Image) -> Image.Image:
+        if self.palette is not None:
+            image.palette = self.palette.copy()
+        return image
+
+    def mapped(self):
+        with open(self.path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @timed("loader.draft")
+    def draft(self, box: tuple) -> Optional[Image.Image]:
+        """A preview no larger than box, or None if this file can only be previewed by decoding it fully."""
+        width, height = self.stored_size
+        if self.orientation in (5, 6, 7, 8):
+            box = (box[1], box[0])
+        size = ImageProcessor.fit_size(width, height, box)
+        if self.format == "JPEG":
+            with ImageProcessor.open_unbounded(self.path) as image:
+                # the decoder picks the smallest DCT scale that still covers size
+                image.draft("RGB" if image.mode not in ("L", "RGB") else image.mode, size)
+                image.load()
+                return self.upright(ImageProcessor.thumbnail(image, size))
+        if self.layout is None:
+            return None
+
+        # only the rows the preview samples are ever paged in
+        rawmode, stride, ystep, offset = self.layout
+        step = max(1, height // size[1])
+        rows = range(0, height, step)
+        starts = (offset + stride * (row if ystep == 1 else height - 1 - row) for row in rows)
+        with self.mapped() as data:
+            sampled = b"".join(data[start:start + stride] for start in starts)
+        image = self.with_palette(Image.frombytes(self.mode, (width, len(rows)), sampled, "raw", rawmode, stride, 1))
+        return self.upright(image.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0))
+
+    @timed("loader.load")
+    def load(self) -> Image.Image:
+        if self.layout is None:
+            with ImageProcessor.open_unbounded(self.path) as image:
+                image.load()
+        else:
+            rawmode, stride, ystep, offset = self.layout
+            with self.mapped() as data:
+                view = memoryview(data)[offset:]
+                mapped = Image.frombuffer(self.mode, self.stored_size, view, "raw", rawmode, stride, ystep)
+                # Pillow uses L/P/RGBA files in place; the copy keeps the image valid if the file is
+                # rewritten or truncated later, and leaves it free to be overwritten on Windows
+                image = self.with_palette(mapped.copy() if mapped.readonly else mapped)
+                del mapped
+                view.release()
+        return self.upright(image)
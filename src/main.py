@@ -1,12 +1,26 @@
+import time
+STARTED = time.perf_counter()
+
 import os
+import sys
+from src.ipc_client import forward_to_running_instance
+
+# a second launch hands its files to the running instance before paying for the GUI imports
+if __name__ == "__main__" and forward_to_running_instance(sys.argv[1:]):
+    sys.exit(0)
+
 import customtkinter as ctk
+from src.startup_timer import StartupTimer
 from src.ui import ImageEditorUI
 
 if __name__ == "__main__":
+    startup = StartupTimer(STARTED)
+    startup.mark("imports")
     theme_path = os.path.join(os.path.dirname(__file__), "..", "resources", "theme.json")
     if os.path.exists(theme_path):
         ctk.set_default_color_theme(theme_path)
     else:
         print("Warning: theme.json not found at", theme_path)
-    app = ImageEditorUI()
+    # the first launch opens its files itself; later launches forward theirs above
+    app = ImageEditorUI(startup, paths=[arg for arg in sys.argv[1:] if os.path.isfile(arg)])
     app.mainloop()
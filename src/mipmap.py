@@ -0,0 +1,43 @@
+import threading
+from PIL import Image
+
+MIN_LEVEL_SIZE = 64
+# levels must be at least this many times the target so the final LANCZOS pass still has detail to filter
+REDUCING_GAP = 2.0
+
+
+class MipmapPyramid:
+    """Power-of-two reductions of one image, for cheap downscales.
+
+    build() is meant to run on a worker thread; levels become usable one by
+    one as they are produced, and lookups before that fall back to the
+    full-resolution image. A pyramid belongs to exactly one image: when the
+    image is edited, the editor drops the pyramid and builds a new one.
+    """
+
+    def __init__(self, image: Image.Image):
+        self.image = image
+        self.levels = [image]
+        self.cancelled = threading.Event()
+
+    def build(self):
+        level = self.image
+        while min(level.size) // 2 >= MIN_LEVEL_SIZE and not self.cancelled.is_set():
+            level = level.reduce(2)
+            self.levels.append(level)
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def level_for(self, size: tuple) -> Image.Image:
+        """Smallest available level that is still REDUCING_GAP times larger than size."""
+        needed = (size[0] * REDUCING_GAP, size[1] * REDUCING_GAP)
+        best = self.image
+        for level in list(self.levels):
+            if level.width < needed[0] or level.height < needed[1]:
+                break
+            best = level
+        return best
+
+    def resize(self, size: tuple, resample=Image.Resampling.LANCZOS) -> Image.Image:
+        return self.level_for(size).resize(size, resample)
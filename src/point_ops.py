@@ -0,0 +1,89 @@
+from PIL import Image, ImageOps
+
+# adjustments that map each channel value independently
+POINT_OPERATIONS = ("brightness", "contrast", "gamma", "levels", "invert")
+
+
+def adjustment_of(operation: dict) -> tuple:
+    """The hashable form of an adjustment operation used in plans, e.g. ("gamma", 0.8)."""
+    name = operation["op"]
+    if name in ("brightness", "contrast"):
+        return name, float(operation["factor"])
+    if name == "gamma":
+        return name, float(operation["value"])
+    if name == "levels":
+        return name, int(operation["black"]), int(operation["white"])
+    return (name,)
+
+
+def validate_adjustment(operation: dict):
+    name = operation["op"]
+    if name in ("brightness", "contrast") and float(operation["factor"]) < 0:
+        raise ValueError(f"{name.capitalize()} factor must not be negative")
+    if name == "gamma" and float(operation["value"]) <= 0:
+        raise ValueError("Gamma must be positive")
+    if name == "levels" and not 0 <= int(operation["black"]) < int(operation["white"]) <= 255:
+        raise ValueError("Levels need 0 <= black < white <= 255")
+
+
+def curve(adjustment: tuple):
+    name = adjustment[0]
+    if name == "brightness":
+        return lambda v: v * adjustment[1]
+    if name == "contrast":
+        # around mid-grey rather than the image mean, so it stays a point operation
+        return lambda v: (v - 128) * adjustment[1] + 128
+    if name == "gamma":
+        return lambda v: 255 * (v / 255) ** (1 / adjustment[1])
+    if name == "levels":
+        black, white = adjustment[1], adjustment[2]
+        return lambda v: (v - black) * 255 / (white - black)
+    if name == "invert":
+        return lambda v: 255 - v
+    raise ValueError(f"Unknown adjustment: {name!r}")
+
+
+def build_lut(adjustments) -> list:
+    """Composes adjustments into one 256-entry table.
+
+    Values stay floating point through the whole chain and are rounded once,
+    but are clamped after every step, exactly as applying them one by one would.
+    """
+    values = [float(v) for v in range(256)]
+    for adjustment in adjustments:
+        func = curve(adjustment)
+        values = [min(255.0, max(0.0, func(v))) for v in values]
+    return [int(v + 0.5) for v in values]
+
+
+def apply_lut(image: Image.Image, lut: list) -> Image.Image:
+    # one pass over the image; alpha gets the identity table
+    table = []
+    for band in image.getbands():
+        table.extend(range(256) if band == "A" else lut)
+    return image.point(table)
+
+
+def apply_adjustments(image: Image.Image, adjustments) -> Image.Image:
+    """Applies a chain of point adjustments and grayscale in at most three passes.
+
+    Adjustments before a grayscale conversion are fused into one per-channel
+    table, the conversion itself mixes the colour channels (ITU-R 601-2 luma,
+    the same weights as ImageProcessor.to_grayscale), and the adjustments after
+    it are fused into one table on the single remaining channel.
+    """
+    if image.mode not in ("L", "LA", "RGB", "RGBA"):
+        image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+
+    names = [adjustment[0] for adjustment in adjustments]
+    split = names.index("grayscale") if "grayscale" in names else len(adjustments)
+    before = list(adjustments[:split])
+    after = [a for a in adjustments[split:] if a[0] != "grayscale"]
+
+    if before:
+        image = apply_lut(image, build_lut(before))
+    if split < len(adjustments) and image.mode not in ("L", "LA"):
+        image = ImageOps.grayscale(image)
+    if after:
+        image = apply_lut(image, build_lut(after))
+    return image
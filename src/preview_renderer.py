@@ -0,0 +1,160 @@
+import weakref
+from collections import OrderedDict
+from typing import Optional
+import customtkinter as ctk
+from PIL import Image, ImageDraw
+from image_processor import ImageProcessor
+from profiler import Profiler, timed
+
+MAX_CACHED_SOURCES = 16
+SELECTION_COLOR = "#ff3b30"
+MIN_FRAME_MS = 20
+
+
+@timed("preview.draft")
+def draft_preview(image: Image.Image, size: tuple) -> Image.Image:
+    # integer box reduction plus a bilinear touch-up; a fraction of the cost of LANCZOS on the full image
+    factor = max(1, min(image.width // size[0], image.height // size[1]))
+    reduced = image.reduce(factor) if factor > 1 else image
+    return reduced if reduced.size == size else reduced.resize(size, Image.Resampling.BILINEAR)
+
+
+class PreviewRenderer:
+    """Shows images in the preview label, drawing each one progressively.
+
+    Previews are cached per source image (by identity; rendered images are
+    never mutated) and target size. The first time an image is shown a
+    cheap draft appears immediately and a LANCZOS version replaces it once
+    the background worker has it. One CTkImage is reused for every frame.
+    A selection, in the source image's pixels, is outlined on every frame.
+    Animated images play from a list of preview-sized frames on the Tk loop.
+    """
+
+    def __init__(self, label: ctk.CTkLabel, tasks, box: tuple):
+        self.label = label
+        self.tasks = tasks
+        self.box = box
+        # mipmaps of the image being edited, when the editor has built them
+        self.pyramid = None
+        self.cache = OrderedDict()
+        self.ctk_image = None
+        self.current = None
+        self.selection = None
+        self.shown_size = None
+        self.playback = None
+
+    def lookup(self, image: Image.Image, size: tuple) -> Optional[tuple]:
+        entry = self.cache.get(id(image))
+        if entry is None or entry[0]() is not image:
+            return None
+        self.cache.move_to_end(id(image))
+        return entry[1].get(size)
+
+    def store(self, image: Image.Image, size: tuple, preview: Image.Image, final: bool):
+        entry = self.cache.get(id(image))
+        if entry is None or entry[0]() is not image:
+            # forget the entry as soon as the source image is gone, so its id cannot be reused for a stale hit
+            key = id(image)
+            entry = self.cache[key] = (weakref.ref(image, lambda _: self.cache.pop(key, None)), {})
+        entry[1][size] = (preview, final)
+        while len(self.cache) > MAX_CACHED_SOURCES:
+            self.cache.popitem(last=False)
+
+    def source_for(self, image: Image.Image, size: tuple) -> Image.Image:
+        if self.pyramid is not None and self.pyramid.image is image:
+            return self.pyramid.level_for(size)
+        return image
+
+    @timed("preview.final")
+    def render_final(self, image: Image.Image, size: tuple) -> Image.Image:
+        return self.source_for(image, size).resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    def preview_of(self, image: Image.Image) -> Image.Image:
+        """Best preview available right now, drafting one if there is none yet."""
+        size = ImageProcessor.fit_size(image.width, image.height, self.box)
+        if size == image.size:
+            return image
+        if cached := self.lookup(image, size):
+            return cached[0]
+        preview = draft_preview(self.source_for(image, size), size)
+        self.store(image, size, preview, final=False)
+        return preview
+
+    def show(self, image: Image.Image):
+        self.stop()
+        self.current = image
+        preview = self.preview_of(image)
+        self.display(preview)
+
+        size = preview.size
+        cached = self.lookup(image, size)
+        if cached is None or cached[1]:
+            self.tasks.cancel('preview')
+            return
+
+        def refined(final: Image.Image):
+            self.store(image, size, final, final=True)
+            if self.current is image and self.playback is None:
+                self.display(final)
+
+        self.tasks.submit('preview', self.render_final, image, size, on_done=refined)
+
+    def show_transient(self, preview: Image.Image):
+        # an already preview-sized frame that is not worth caching, e.g. while the scale slider moves
+        self.stop()
+        self.current = None
+        self.display(preview)
+
+    def play(self, frames: list, durations: list, index: int = 0):
+        # frames of the image shown last; each one stays up for its own duration
+        self.stop()
+        self.display(frames[index])
+        self.playback = self.label.after(max(MIN_FRAME_MS, int(durations[index])), self.play,
+                                         frames, durations, (index + 1) % len(frames))
+
+    def stop(self):
+        if self.playback is not None:
+            self.label.after_cancel(self.playback)
+            self.playback = None
+
+    def clear(self):
+        self.stop()
+        self.current = None
+        self.display(Image.new("RGBA", (1, 1)))
+
+    def set_selection(self, box: Optional[tuple]):
+        self.selection = box
+        if self.current is not None:
+            self.display(self.preview_of(self.current))
+
+    def to_source(self, x: int, y: int, width: int, height: int) -> Optional[tuple]:
+        """Maps a point in a width x height widget showing the centered frame to source image pixels."""
+        if self.current is None or self.shown_size is None:
+            return None
+        scaling = ctk.ScalingTracker.get_widget_scaling(self.label)
+        shown_width, shown_height = self.shown_size[0] * scaling, self.shown_size[1] * scaling
+        source_x = (x - (width - shown_width) / 2) * self.current.width / shown_width
+        source_y = (y - (height - shown_height) / 2) * self.current.height / shown_height
+        return (min(max(0, round(source_x)), self.current.width),
+                min(max(0, round(source_y)), self.current.height))
+
+    def with_selection(self, preview: Image.Image) -> Image.Image:
+        ratio = preview.width / self.current.width
+        frame = preview.convert("RGB")
+        ImageDraw.Draw(frame).rectangle([round(value * ratio) for value in self.selection],
+                                        outline=SELECTION_COLOR, width=2)
+        return frame
+
+    def display(self, preview: Image.Image):
+        with Profiler.span("preview.display", preview):
+            if self.selection is not None and self.current is not None:
+                preview = self.with_selection(preview)
+            self.show_frame(preview)
+
+    def show_frame(self, preview: Image.Image):
+        self.shown_size = preview.size
+        if self.ctk_image is None:
+            self.ctk_image = ctk.CTkImage(light_image=preview, size=preview.size)
+            self.label.configure(image=self.ctk_image)
+        else:
+            self.ctk_image.configure(light_image=preview, size=preview.size)
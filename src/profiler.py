@@ -0,0 +1,158 @@
+import functools
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from PIL import Image
+
+# set to a file path to record spans from launch and write a Chrome trace there on exit
+TRACE_ENV = "QUICKIMGEDITOR_TRACE"
+MAX_EVENTS = 20000
+ROLLING_SAMPLES = 20
+
+
+def image_tags(image) -> dict:
+    if isinstance(image, Image.Image):
+        return {"size": f"{image.width}x{image.height}", "mode": image.mode}
+    return {}
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes, or 0 when it cannot be read."""
+    try:
+        if sys.platform == "win32":
+            import win32api
+            import win32process
+            return win32process.GetProcessMemoryInfo(win32api.GetCurrentProcess())["WorkingSetSize"]
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return 0
+
+
+class Profiler:
+    """Timing spans around the editor's hot paths.
+
+    Spans cost a single flag check while the profiler is disabled. Once
+    enabled, each finished span is kept in a bounded ring buffer tagged with
+    the thread and the size and mode of the image involved; with memory
+    sampling on, the RSS and Python heap are sampled at every span end.
+    The buffer can be exported as Chrome trace-event JSON (chrome://tracing,
+    Perfetto) and summarized as rolling latencies for the status bar.
+    """
+    enabled = False
+    sample_memory = False
+    started = time.perf_counter()
+    events = deque(maxlen=MAX_EVENTS)
+    samples = deque(maxlen=MAX_EVENTS)
+
+    @staticmethod
+    def enable(memory: bool = False):
+        Profiler.enabled = True
+        Profiler.set_memory_sampling(memory)
+
+    @staticmethod
+    def disable():
+        Profiler.enabled = False
+        Profiler.set_memory_sampling(False)
+
+    @staticmethod
+    def set_memory_sampling(memory: bool):
+        import tracemalloc
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not memory and Profiler.sample_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        Profiler.sample_memory = memory
+
+    @staticmethod
+    def clear():
+        Profiler.events.clear()
+        Profiler.samples.clear()
+
+    @staticmethod
+    @contextmanager
+    def span(name: str, image=None, **tags):
+        if not Profiler.enabled:
+            yield tags
+            return
+        tags.update(image_tags(image))
+        start = time.perf_counter()
+        try:
+            yield tags
+        finally:
+            Profiler.record(name, start, time.perf_counter(), tags)
+
+    @staticmethod
+    def record(name: str, start: float, end: float, tags: dict):
+        Profiler.events.append((name, start, end - start, threading.get_ident(), threading.current_thread().name, tags))
+        if Profiler.sample_memory:
+            import tracemalloc
+            python_bytes = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+            Profiler.samples.append((end, current_rss(), python_bytes))
+
+    @staticmethod
+    def rolling(limit: int = 3) -> list:
+        """(name, last ms, median ms) for the most recently finished distinct operations."""
+        events = list(Profiler.events)
+        latest = []
+        for name, *_ in reversed(events):
+            if name not in latest:
+                latest.append(name)
+                if len(latest) == limit:
+                    break
+        summary = []
+        for name in latest:
+            durations = [event[2] * 1000 for event in events if event[0] == name][-ROLLING_SAMPLES:]
+            summary.append((name, durations[-1], statistics.median(durations)))
+        return summary
+
+    @staticmethod
+    def format_rolling(limit: int = 3) -> str:
+        return " · ".join(f"{name} {last:.0f} ms (p50 {median:.0f})" for name, last, median in Profiler.rolling(limit))
+
+    @staticmethod
+    def chrome_trace() -> dict:
+        pid = os.getpid()
+        micros = lambda t: (t - Profiler.started) * 1e6
+        trace, threads = [], {}
+        for name, start, duration, tid, thread_name, tags in list(Profiler.events):
+            threads[tid] = thread_name
+            trace.append({
+                "name": name, "cat": name.split(".")[0], "ph": "X", "pid": pid, "tid": tid,
+                "ts": micros(start), "dur": duration * 1e6, "args": tags,
+            })
+        for at, rss, python_bytes in list(Profiler.samples):
+            trace.append({
+                "name": "memory", "ph": "C", "pid": pid, "ts": micros(at),
+                "args": {"rss_mb": rss / 2 ** 20, "python_heap_mb": python_bytes / 2 ** 20},
+            })
+        for tid, thread_name in threads.items():
+            trace.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}})
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    @staticmethod
+    def export_chrome_trace(path: str):
+        with open(path, "w") as f:
+            json.dump(Profiler.chrome_trace(), f)
+
+
+def timed(name: str):
+    """Decorator wrapping a call in a span, tagged with the first image argument or the image returned."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not Profiler.enabled:
+                return func(*args, **kwargs)
+            image = next((arg for arg in args if isinstance(arg, Image.Image)), None)
+            with Profiler.span(name, image) as tags:
+                result = func(*args, **kwargs)
+                if image is None:
+                    tags.update(image_tags(result))
+                return result
+        return wrapper
+    return decorator
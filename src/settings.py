@@ -2,9 +2,9 @@ import os
 import sys
 import json
 import logging
-from win32com.client import Dispatch
 
-SETTINGS_FILE = os.path.join(os.getenv('APPDATA'), 'ImageEditor', 'settings.json')
+# APPDATA only exists on Windows; headless modes also run on Linux
+SETTINGS_FILE = os.path.join(os.getenv('APPDATA') or os.path.expanduser('~/.config'), 'ImageEditor', 'settings.json')
 
 
 class SettingsManager:
@@ -25,8 +25,16 @@ class SettingsManager:
         with open(SETTINGS_FILE, 'w') as f:
             json.dump(settings, f)
 
+    @staticmethod
+    def update(values: dict):
+        # merge into what is stored, so the editor and the headless modes keep each other's keys
+        SettingsManager.save({**SettingsManager.load(), **values})
+
     @staticmethod
     def set_startup(enable: bool):
+        # launching at login is only offered on Windows
+        if sys.platform != "win32":
+            return
         try:
             exe_path = os.path.abspath(sys.executable)
             startup_folder = os.path.join(
@@ -35,11 +43,14 @@ class SettingsManager:
             )
             shortcut = os.path.join(startup_folder, 'QuickImgEditor.lnk')
             if enable:
+                from win32com.client import Dispatch
                 shell = Dispatch('WScript.Shell')
+                # CreateShortCut loads an existing shortcut; only write it when it points elsewhere
                 link = shell.CreateShortCut(shortcut)
-                link.Targetpath = exe_path
-                link.WorkingDirectory = os.path.dirname(exe_path)
-                link.IconLocation = exe_path + ",0"
+                wanted = (exe_path, os.path.dirname(exe_path), exe_path + ",0")
+                if os.path.exists(shortcut) and (link.Targetpath, link.WorkingDirectory, link.IconLocation) == wanted:
+                    return
+                link.Targetpath, link.WorkingDirectory, link.IconLocation = wanted
                 link.save()
             else:
                 if os.path.exists(shortcut):
@@ -0,0 +1,29 @@
+import json
+import os
+import sys
+import time
+
+# set by benchmarks/startup.py: print the phase timings and exit once startup is done
+TRACE_ENV = "QUICKIMGEDITOR_STARTUP_TRACE"
+
+
+class StartupTimer:
+    """Records how long each startup phase took, in milliseconds."""
+
+    def __init__(self, started: float = None):
+        self.started = started if started is not None else time.perf_counter()
+        self.last = self.started
+        self.phases = {}
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases[phase] = (now - self.last) * 1000
+        self.last = now
+
+    def total(self) -> float:
+        return (self.last - self.started) * 1000
+
+    def finish(self, app):
+        if os.environ.get(TRACE_ENV):
+            print(json.dumps({"phases": self.phases, "total": self.total()}), file=sys.stdout, flush=True)
+            app.after(0, app.destroy)
@@ -0,0 +1,79 @@
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+POLL_INTERVAL_MS = 15
+
+
+class TaskRunner:
+    """Runs image work on a thread pool and delivers results back on the Tk loop.
+
+    Jobs are grouped by key. Submitting a new job under a key supersedes the
+    previous one: it is cancelled if it has not started yet, and its result is
+    dropped if it has, so callbacks only ever see the newest generation.
+    """
+
+    def __init__(self, app, max_workers: int = 2, on_busy=None):
+        self.app = app
+        self.on_busy = on_busy
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-worker")
+        self.results = queue.SimpleQueue()
+        self.generations = {}
+        self.futures = {}
+        self.polling = False
+
+    def submit(self, key: str, func, *args, on_done=None, on_error=None) -> int:
+        self.cancel(key)
+        generation = self.generations[key]
+        future = self.executor.submit(func, *args)
+        self.futures[key] = future
+        # runs on the worker thread; only hand the result over, never touch Tk here
+        future.add_done_callback(
+            lambda f: self.results.put((key, generation, f, on_done, on_error))
+        )
+        if self.on_busy:
+            self.on_busy(True)
+        self.schedule_poll()
+        return generation
+
+    def cancel(self, key: str):
+        self.generations[key] = self.generations.get(key, 0) + 1
+        future = self.futures.pop(key, None)
+        if future is not None:
+            future.cancel()
+
+    def busy(self, key: str = None) -> bool:
+        if key is None:
+            return bool(self.futures)
+        return key in self.futures
+
+    def schedule_poll(self):
+        if not self.polling:
+            self.polling = True
+            self.app.after(POLL_INTERVAL_MS, self.poll)
+
+    def poll(self):
+        self.polling = False
+        while True:
+            try:
+                key, generation, future, on_done, on_error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if future.cancelled() or generation != self.generations.get(key):
+                continue  # superseded while it was running
+            self.futures.pop(key, None)
+            error = future.exception()
+            if error is not None:
+                logging.warning(f"Background task '{key}' failed: {error}")
+                if on_error:
+                    on_error(error)
+            elif on_done:
+                on_done(future.result())
+
+        if self.futures:
+            self.schedule_poll()
+        elif self.on_busy:
+            self.on_busy(False)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
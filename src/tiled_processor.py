@@ -0,0 +1,302 @@
+import math
+import os
+import struct
+import zlib
+from PIL import Image, ImageOps
+from edit_pipeline import REGION_MODES, apply_region
+from image_processor import ImageProcessor
+
+DEFAULT_MEMORY_LIMIT = 256 * 1024 * 1024
+JPEG_BLOCK = 8
+LANCZOS_SUPPORT = 3.0
+MIN_STRIP_ROWS = 16
+
+
+def bytes_per_pixel(mode: str) -> int:
+    # Pillow keeps every multi-band pixel in 32 bits
+    return {"1": 1, "L": 1, "P": 1, "I;16": 2}.get(mode, 4)
+
+
+class SourceStage:
+    """Rows of an already opened image."""
+
+    def __init__(self, image: Image.Image):
+        self.image = image
+        self.size = image.size
+        self.mode = image.mode
+
+    def rows(self, top: int, bottom: int) -> Image.Image:
+        return self.image.crop((0, top, self.size[0], bottom))
+
+    def bytes_for(self, rows: int) -> int:
+        # the source is already resident; cropping copies the strip
+        return self.size[0] * rows * bytes_per_pixel(self.mode)
+
+
+class GrayscaleStage:
+    def __init__(self, upstream):
+        self.upstream = upstream
+        self.size = upstream.size
+        self.mode = "L"
+
+    def rows(self, top: int, bottom: int) -> Image.Image:
+        return ImageOps.grayscale(self.upstream.rows(top, bottom))
+
+    def bytes_for(self, rows: int) -> int:
+        return self.upstream.bytes_for(rows) + self.size[0] * rows
+
+
+class PointStage:
+    """Fused point adjustments; every output row depends only on the same input row."""
+
+    def __init__(self, upstream, adjustments: tuple):
+        self.upstream = upstream
+        self.adjustments = adjustments
+        self.size = upstream.size
+        if upstream.mode in ("L", "LA"):
+            self.mode = upstream.mode
+        elif any(adjustment[0] == "grayscale" for adjustment in adjustments):
+            self.mode = "L"
+        else:
+            self.mode = upstream.mode if upstream.mode in ("RGB", "RGBA") else "RGB"
+
+    def rows(self, top: int, bottom: int) -> Image.Image:
+        return ImageProcessor.adjust(self.upstream.rows(top, bottom), self.adjustments)
+
+    def bytes_for(self, rows: int) -> int:
+        return self.upstream.bytes_for(rows) + self.size[0] * rows * bytes_per_pixel(self.mode)
+
+
+class LowerQualityStage:
+    """JPEG round trip on strips aligned to 8x8 blocks, identical to the whole-image result."""
+
+    def __init__(self, upstream):
+        self.upstream = upstream
+        self.size = upstream.size
+        self.mode = upstream.mode if "A" in upstream.mode or upstream.mode == "L" else "RGB"
+
+    def rows(self, top: int, bottom: int) -> Image.Image:
+        block_top = top // JPEG_BLOCK * JPEG_BLOCK
+        block_bottom = min(-(-bottom // JPEG_BLOCK) * JPEG_BLOCK, self.size[1])
+        strip = ImageProcessor.lower_quality(self.upstream.rows(block_top, block_bottom))
+        return strip.crop((0, top - block_top, self.size[0], bottom - block_top))
+
+    def bytes_for(self, rows: int) -> int:
+        rows += 2 * JPEG_BLOCK
+        return self.upstream.bytes_for(rows) + 2 * self.size[0] * rows * bytes_per_pixel(self.mode)
+
+
+class PixelateStage:
+    """Pixelation on strips aligned to the block grid, identical to the whole-image result."""
+
+    def __init__(self, upstream, block: int):
+        self.upstream = upstream
+        self.block = block
+        self.size = upstream.size
+        self.mode = "RGBA" if upstream.mode in ("1", "P") else upstream.mode
+
+    def rows(self, top: int, bottom: int) -> Image.Image:
+        block_top = top // self.block * self.block
+        block_bottom = min(-(-bottom // self.block) * self.block, self.size[1])
+        strip = ImageProcessor.pixelate(self.upstream.rows(block_top, block_bottom), self.block)
+        return strip.crop((0, top - block_top, self.size[0], bottom - block_top))
+
+    def bytes_for(self, rows: int) -> int:
+        rows += 2 * self.block
+        return self.upstream.bytes_for(rows) + 2 * self.size[0] * rows * bytes_per_pixel(self.mode)
+
+
+class RegionStage:
+    """Rows with a rectangle edited; the patch is computed once, the first time a strip crosses it."""
+
+    def __init__(self, upstream, box: tuple, steps: tuple):
+        self.upstream = upstream
+        self.box = box
+        self.steps = steps
+        self.size = upstream.size
+        self.mode = upstream.mode if upstream.mode in REGION_MODES else "RGBA"
+        self.patch = None
+
+    def rows(self, top: int, bottom: int) -> Image.Image:
+        strip = self.upstream.rows(top, bottom)
+        if strip.mode != self.mode:
+            strip = strip.convert(self.mode)
+        left, box_top, right, box_bottom = self.box
+        if bottom <= box_top or top >= box_bottom:
+            return strip
+        if self.patch is None:
+            region = self.upstream.rows(box_top, box_bottom).crop((left, 0, right, box_bottom - box_top))
+            self.patch = apply_region(region, (0, 0) + region.size, self.steps)[1]
+        overlap_top, overlap_bottom = max(top, box_top), min(bottom, box_bottom)
+        strip.paste(self.patch.crop((0, overlap_top - box_top, right - left, overlap_bottom - box_top)),
+                    (left, overlap_top - top))
+        return strip
+
+    def bytes_for(self, rows: int) -> int:
+        # the whole-width rows under the box are pulled once to make the patch, which is then kept
+        box_rows = self.box[3] - self.box[1]
+        patch_bytes = (self.box[2] - self.box[0]) * box_rows * bytes_per_pixel(self.mode)
+        return max(self.upstream.bytes_for(rows), self.upstream.bytes_for(box_rows)) + patch_bytes
+
+
+class ResizeStage:
+    """LANCZOS resize computed one strip of output rows at a time.
+
+    Each strip pulls the source rows under the filter's full support, then
+    resamples them with a fractional source box, so the sample positions and
+    weights are those of a single full-image resize and strip borders are
+    invisible (results match a full resize to within floating-point rounding).
+    """
+
+    def __init__(self, upstream, width: int, height: int):
+        self.upstream = upstream
+        self.size = (width, height)
+        self.mode = upstream.mode
+        self.scale = upstream.size[1] / height
+        self.support = LANCZOS_SUPPORT * max(self.scale, 1.0)
+
+    def source_range(self, top: int, bottom: int) -> tuple:
+        src_top = max(0, math.floor(top * self.scale - self.support) - 1)
+        src_bottom = min(self.upstream.size[1], math.ceil(bottom * self.scale + self.support) + 1)
+        return src_top, src_bottom
+
+    def rows(self, top: int, bottom: int) -> Image.Image:
+        src_top, src_bottom = self.source_range(top, bottom)
+        strip = self.upstream.rows(src_top, src_bottom)
+        box = (0, top * self.scale - src_top, strip.width, bottom * self.scale - src_top)
+        return strip.resize((self.size[0], bottom - top), Image.Resampling.LANCZOS, box=box)
+
+    def bytes_for(self, rows: int) -> int:
+        src_top, src_bottom = self.source_range(0, rows)
+        return self.upstream.bytes_for(src_bottom - src_top) + self.size[0] * rows * bytes_per_pixel(self.mode)
+
+
+def build_stages(image: Image.Image, plan: tuple):
+    """Chains stages for an EditPipeline plan ending in the final output rows."""
+    stage = SourceStage(image)
+    for step in plan:
+        name = step[0]
+        if name == "resize":
+            stage = ResizeStage(stage, step[1], step[2])
+        elif name == "grayscale":
+            stage = GrayscaleStage(stage)
+        elif name == "lower_quality":
+            stage = LowerQualityStage(stage)
+        elif name == "point":
+            stage = PointStage(stage, step[1])
+        elif name == "pixelate":
+            stage = PixelateStage(stage, step[1])
+        elif name == "region":
+            stage = RegionStage(stage, step[1], step[2])
+        else:
+            raise ValueError(f"Step {name!r} cannot be tiled")
+    return stage
+
+
+def strip_rows(stage, memory_limit: int) -> int:
+    # largest power-of-two strip whose working set fits under the ceiling
+    rows = 1 << max(0, stage.size[1] - 1).bit_length()
+    while rows > MIN_STRIP_ROWS and stage.bytes_for(rows) > memory_limit:
+        rows //= 2
+    return max(1, min(rows, stage.size[1]))
+
+
+class PngStripWriter:
+    """Streams rows into a PNG file without holding the whole image."""
+    COLOR_TYPES = {"L": 0, "RGB": 2, "LA": 4, "RGBA": 6}
+
+    def __init__(self, f, size: tuple, mode: str, compress_level: int = 6):
+        self.f = f
+        self.stride = size[0] * len(mode)
+        self.compressor = zlib.compressobj(compress_level)
+        f.write(b"\x89PNG\r\n\x1a\n")
+        self.chunk(b"IHDR", struct.pack(">IIBBBBB", size[0], size[1], 8, self.COLOR_TYPES[mode], 0, 0, 0))
+
+    def chunk(self, kind: bytes, data: bytes):
+        self.f.write(struct.pack(">I", len(data)) + kind + data)
+        self.f.write(struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+    def write(self, strip: Image.Image):
+        raw = strip.tobytes()
+        # filter type 0 on every row; adaptive filtering would need the previous row across strips
+        rows = b"".join(b"\x00" + raw[i:i + self.stride] for i in range(0, len(raw), self.stride))
+        if data := self.compressor.compress(rows):
+            self.chunk(b"IDAT", data)
+
+    def close(self):
+        self.chunk(b"IDAT", self.compressor.flush())
+        self.chunk(b"IEND", b"")
+
+
+class PpmStripWriter:
+    """Streams rows into a binary PGM/PPM file."""
+
+    def __init__(self, f, size: tuple, mode: str):
+        self.f = f
+        f.write(b"P5" if mode == "L" else b"P6")
+        f.write(f"\n{size[0]} {size[1]}\n255\n".encode("ascii"))
+
+    def write(self, strip: Image.Image):
+        self.f.write(strip.tobytes())
+
+    def close(self):
+        pass
+
+
+def open_strip_writer(f, path: str, size: tuple, mode: str):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".png" and mode in PngStripWriter.COLOR_TYPES:
+        return PngStripWriter(f, size, mode)
+    if extension in (".ppm", ".pgm", ".pnm") and mode in ("L", "RGB"):
+        return PpmStripWriter(f, size, mode)
+    return None
+
+
+class TiledProcessor:
+    """Bounded-memory versions of the ImageProcessor operations.
+
+    Output is produced in horizontal strips sized to fit under memory_limit
+    and written straight to the encoder, so no full-size intermediate or
+    output buffer is allocated. The decoded source is the only full image
+    held in memory. PNG (L/LA/RGB/RGBA) and PPM/PGM outputs stream; other
+    formats are assembled in memory before saving.
+    """
+
+    @staticmethod
+    def render(image: Image.Image, plan: tuple, destination: str, memory_limit: int = DEFAULT_MEMORY_LIMIT):
+        stage = build_stages(image, plan)
+        rows = strip_rows(stage, memory_limit)
+        temporary = destination + ".part"
+        with open(temporary, "wb") as f:
+            writer = open_strip_writer(f, destination, stage.size, stage.mode)
+            output = Image.new(stage.mode, stage.size) if writer is None else None
+            for top in range(0, stage.size[1], rows):
+                strip = stage.rows(top, min(top + rows, stage.size[1]))
+                if writer is None:
+                    output.paste(strip, (0, top))
+                else:
+                    writer.write(strip)
+            if writer is None:
+                output_format = Image.registered_extensions().get(os.path.splitext(destination)[1].lower())
+                if output_format == "JPEG" and output.mode not in ("RGB", "L"):
+                    output = output.convert("RGB")
+                output.save(f, format=output_format)
+            else:
+                writer.close()
+        os.replace(temporary, destination)
+
+    @staticmethod
+    def scale(image: Image.Image, scale_factor: float, destination: str, memory_limit: int = DEFAULT_MEMORY_LIMIT):
+        new_size = (int(image.width * scale_factor), int(image.height * scale_factor))
+        TiledProcessor.render(image, (("resize",) + new_size,), destination, memory_limit)
+
+    @staticmethod
+    def resize(image: Image.Image, width: int, height: int, destination: str,
+               memory_limit: int = DEFAULT_MEMORY_LIMIT):
+        if width <= 0 or height <= 0:
+            raise ValueError("Dimensions must be positive integers")
+        TiledProcessor.render(image, (("resize", width, height),), destination, memory_limit)
+
+    @staticmethod
+    def lower_quality(image: Image.Image, destination: str, memory_limit: int = DEFAULT_MEMORY_LIMIT):
+        TiledProcessor.render(image, (("lower_quality",),), destination, memory_limit)
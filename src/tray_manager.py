@@ -26,12 +26,13 @@ class TrayManager:
         self.icon_thread = threading.Thread(target=self.icon.run, daemon=True)
         self.icon_thread.start()
 
+    # menu callbacks run on the icon thread; the app's command queue runs them on the Tk loop
     def toggle_visibility(self):
-        self.app.after(0, self.app.toggle_visibility)
+        self.app.commands.post('toggle')
 
     def show_options(self):
-        self.app.after(0, self.app.open_options_page)
+        self.app.commands.post('options')
 
     def exit_app(self):
         self.icon.stop()
-        self.app.after(0, self.app.destroy)
+        self.app.commands.post('exit')
@@ -1,32 +1,74 @@
 import logging
+import os
 import tkinter as tk
 from tkinter import filedialog
 import customtkinter as ctk
-import keyboard
 from datetime import datetime
 from PIL import Image
+from typing import TYPE_CHECKING
 from clipboard_manager import ClipboardManager
-from image_processor import ImageProcessor
+from command_queue import CommandQueue
+from image_handle import ImageHandle
+from image_processor import PIXELATE_BLOCK, ImageProcessor
+from ipc_client import DEFAULT_PORT
 from settings import SettingsManager
-from src.changes_history import ChangesHistory
-from tray_manager import TrayManager
+from edit_pipeline import REGION_OPERATIONS, apply_step, build_plan, validate_operation
+from mipmap import MipmapPyramid
+from preview_renderer import PreviewRenderer
+from profiler import Profiler, TRACE_ENV
+from startup_timer import StartupTimer
+from task_runner import TaskRunner
+from workspace import Workspace
+
+# animation, compressor, exporter, ipc_service and lazy_loader are imported where first used, off the startup path
+if TYPE_CHECKING:
+    from lazy_loader import LazyImage
 
 THUMBNAIL_SIZE = (700, 700)
+FILMSTRIP_THUMBNAIL_SIZE = (64, 64)
 DEFAULT_SCALE = 100
+LATENCY_REFRESH_MS = 500
+# slider name -> (operation, parameter, minimum, maximum), in percent of the parameter
+ADJUSTMENTS = {
+    "Brightness": ("brightness", "factor", 0, 200),
+    "Contrast": ("contrast", "factor", 0, 200),
+    "Gamma": ("gamma", "value", 20, 300),
+}
+# encoder options shown in the export window, per format
+EXPORT_FIELDS = {
+    "PNG": (("compress_level", "Level"), ("optimize", "Optimize")),
+    "JPEG": (("quality", "Quality"), ("progressive", "Progressive"), ("subsampling", "Subsampling")),
+    "WEBP": (("quality", "Quality"), ("lossless", "Lossless"), ("method", "Method"), ("minimize_size", "Minimize")),
+    "GIF": (("optimize", "Optimize"),),
+}
+
+
+def write_bytes(path: str, data: bytes):
+    with open(path, 'wb') as f:
+        f.write(data)
 
 
 class ImageEditorUI(ctk.CTk):
-    def __init__(self):
+    def __init__(self, startup: StartupTimer = None, paths: list = None):
         super().__init__()
+        self.startup = startup or StartupTimer()
+        # files given on the command line, opened once the window is up
+        self.startup_paths = paths or []
+        self.startup.mark("tk_init")
         self.title("QuickImgEditor")
         self.geometry("1000x700")
 
-        # Image state
-        self.original_image = None
-        self.base_image = None
+        # Image state; the original, edits and history of each open image live in its workspace document
         self.processed_image = None
+        self.pyramid = None
+        self.processed_stale = False
+        self.compressor = None
+        self.compressed = None
         self.current_scale = DEFAULT_SCALE
-        self.is_scaling = False
+        # rectangle of base_image that region edits apply to, and the size it was drawn on
+        self.selection = None
+        self.selection_size = None
+        self.selection_start = None
 
         # Load settings
         settings = SettingsManager.load()
@@ -36,15 +78,83 @@ class ImageEditorUI(ctk.CTk):
         self.min_scale = settings.get('min_scale', 10)
         self.max_scale = settings.get('max_scale', 200)
         self.run_at_startup = settings.get('run_at_startup', False)
-        SettingsManager.set_startup(self.run_at_startup)
+        self.compress_target_kb = settings.get('compress_target_kb', 1024)
+        self.show_latency = settings.get('show_latency', False)
+        self.profile_memory = settings.get('profile_memory', False)
+        # merged with the encoder defaults when an export needs them
+        self.export_options = settings.get('export_options', {})
+        self.export_formats = settings.get('export_formats', ["PNG"])
+        self.export_scales = settings.get('export_scales', "100")
+        self.workspace_memory_mb = settings.get('workspace_memory_mb', 1024)
+        self.ipc_processing = settings.get('ipc_processing', False)
+        self.ipc_port = settings.get('ipc_port', DEFAULT_PORT)
+        self.apply_profiling()
+        self.startup.mark("settings")
+
+        self.workspace = Workspace(self.workspace_memory_mb * 1024 * 1024)
+        self.tabs = {}
+        # document id -> what to run once that document's full-resolution decode lands
+        self.load_waiters = {}
+        # the document the pending 'activate' task is restoring
+        self.activating = None
+        self.tasks = TaskRunner(self, on_busy=self.set_busy)
+        self.exporter = None
+        self.tray = None
+        self.ipc_server = None
+        # hotkey, tray and IPC threads never touch Tk; they post here and the Tk loop runs the commands
+        self.commands = CommandQueue(self, {
+            'toggle': self.toggle_visibility,
+            'show': self.show_window,
+            'open': self.open_paths,
+            'history': self.move_history,
+            'options': self.open_options_page,
+            'exit': self.destroy,
+        })
 
         # UI components
         self.setup_ui()
         self.setup_bindings()
+        self.startup.mark("widgets")
+
+        # everything the first frame does not need waits until the window is on screen
+        self.after(10, self.finish_startup)
+
+    @property
+    def document(self):
+        return self.workspace.active
+
+    @property
+    def pipeline(self):
+        return self.document.pipeline if self.document else None
+
+    # documents hold shared handles; images are never written in place, so states share pixels instead of copying
+    @property
+    def original_image(self):
+        return self.document.original.image if self.document and self.document.original else None
+
+    @property
+    def base_image(self):
+        return self.document.base.image if self.document and self.document.base else None
+
+    @base_image.setter
+    def base_image(self, image):
+        self.document.base = ImageHandle(image, "render")
+        self.refresh_thumbnail(self.document)
+
+    def finish_startup(self):
+        self.update_idletasks()
+        self.startup.mark("first_frame")
+        self.setup_hotkeys()
+        self.startup.mark("hotkeys")
         self.setup_tray()
+        self.startup.mark("tray")
+        self.setup_ipc()
+        self.startup.mark("ipc")
+        SettingsManager.set_startup(self.run_at_startup)
+        self.startup.mark("startup_shortcut")
         self.load_initial_image()
-
-        self.changes_history = ChangesHistory()
+        self.startup.mark("clipboard")
+        self.startup.finish(self)
 
     def setup_ui(self):
         self.grid_columnconfigure(1, weight=1)
@@ -52,27 +162,47 @@ class ImageEditorUI(ctk.CTk):
 
         self.create_control_panel()
         self.create_image_preview()
+        self.create_filmstrip()
         self.create_status_bar()
 
     def setup_bindings(self):
         self.protocol("WM_DELETE_WINDOW", self.on_close)
-        keyboard.add_hotkey(self.toggle_hotkey, self.toggle_visibility)
-        keyboard.add_hotkey(self.undo_hotkey, lambda: self.set_image(self.changes_history.undo()))
-        keyboard.add_hotkey(self.redo_hotkey, lambda: self.set_image(self.changes_history.redo()))
         self.bind("<Control-v>", lambda e: self.load_from_clipboard())
         self.bind("<Control-c>", lambda e: self.copy_to_clipboard())
+        self.bind("<Control-w>", lambda e: self.close_document())
+        self.bind("<Escape>", lambda e: self.clear_selection())
+
+    def setup_hotkeys(self):
+        import keyboard
+        keyboard.add_hotkey(self.toggle_hotkey, self.commands.poster('toggle'))
+        keyboard.add_hotkey(self.undo_hotkey, self.commands.poster('undo'))
+        keyboard.add_hotkey(self.redo_hotkey, self.commands.poster('redo'))
 
     def setup_tray(self):
+        from tray_manager import TrayManager
         self.tray = TrayManager(self)
         self.tray.create_icon()
         self.tray.run()
 
+    def setup_ipc(self):
+        from ipc_service import IpcServer
+        try:
+            self.ipc_server = IpcServer(self.ipc_port,
+                                        on_show=self.commands.poster('show'),
+                                        on_open=lambda paths: self.commands.post('open', paths),
+                                        processing=self.ipc_processing)
+            self.ipc_server.start()
+        except OSError as e:
+            logging.warning(f"IPC endpoint unavailable on port {self.ipc_port}: {e}")
+            self.ipc_server = None
+
     def create_control_panel(self):
         self.control_frame = ctk.CTkFrame(self)
         self.control_frame.grid(row=0, column=0, sticky="ns", padx=5, pady=5)
 
         self.create_action_buttons()
         self.create_processing_buttons()
+        self.create_adjustment_controls()
         self.create_resize_controls()
         self.create_scale_controls()
         self.create_export_buttons()
@@ -93,12 +223,30 @@ class ImageEditorUI(ctk.CTk):
 
         effects = [
             ("Convert to Grayscale", self.convert_to_grayscale),
-            ("Lower Quality", self.lower_quality)
+            ("Lower Quality", self.lower_quality),
+            ("Pixelate", self.pixelate),
+            ("Invert Colors", self.invert_colors),
+            ("Compress to Target", self.compress_image)
         ]
         for text, cmd in effects:
             btn = ctk.CTkButton(processing_frame, text=text, command=cmd)
             btn.pack(pady=2, fill='x')
 
+    def create_adjustment_controls(self):
+        adjust_frame = ctk.CTkFrame(self.control_frame)
+        adjust_frame.pack(pady=10, fill='x')
+
+        self.adjustment_sliders = {}
+        for row, (text, (_, _, low, high)) in enumerate(ADJUSTMENTS.items()):
+            ctk.CTkLabel(adjust_frame, text=text).grid(row=row, column=0, sticky='w', padx=5)
+            slider = ctk.CTkSlider(adjust_frame, from_=low, to=high, width=120, command=self.on_adjust_slide)
+            slider.set(DEFAULT_SCALE)
+            slider.grid(row=row, column=1, sticky='we', padx=5)
+            self.adjustment_sliders[text] = slider
+
+        ctk.CTkButton(adjust_frame, text="Apply Adjustments", command=self.apply_adjustments).grid(
+            row=len(ADJUSTMENTS), column=0, columnspan=2, pady=5, sticky='we')
+
     def create_resize_controls(self):
         resize_frame = ctk.CTkFrame(self.control_frame)
         resize_frame.pack(pady=10, fill='x')
@@ -135,7 +283,8 @@ class ImageEditorUI(ctk.CTk):
 
         actions = [
             ("Copy Image", self.copy_to_clipboard),
-            ("Save Image", self.save_image)
+            ("Save Image", self.save_image),
+            ("Export...", self.open_export_window)
         ]
         for text, cmd in actions:
             btn = ctk.CTkButton(export_frame, text=text, command=cmd)
@@ -144,51 +293,276 @@ class ImageEditorUI(ctk.CTk):
     def create_image_preview(self):
         self.preview_label = ctk.CTkLabel(self, text="")
         self.preview_label.grid(row=0, column=1, padx=10, pady=5, sticky="n")
+        self.preview = PreviewRenderer(self.preview_label, self.tasks, THUMBNAIL_SIZE)
+        # dragging on the preview selects the region that edits apply to
+        self.preview_label.bind("<ButtonPress-1>", self.on_select_start)
+        self.preview_label.bind("<B1-Motion>", self.on_select_drag)
+        self.preview_label.bind("<ButtonRelease-1>", self.on_select_end)
+
+    def selection_point(self, event):
+        return self.preview.to_source(event.x, event.y, event.widget.winfo_width(), event.widget.winfo_height())
+
+    def on_select_start(self, event):
+        self.selection_start = self.selection_point(event) if self.base_image else None
+
+    def on_select_drag(self, event):
+        if self.selection_start is None or (point := self.selection_point(event)) is None:
+            return
+        (x0, y0), (x1, y1) = self.selection_start, point
+        self.preview.set_selection((min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)))
+
+    def on_select_end(self, event):
+        if self.selection_start is None:
+            return
+        self.selection_start = None
+        box = self.preview.selection
+        # a click without a drag clears the selection
+        if box is None or box[2] - box[0] < 2 or box[3] - box[1] < 2:
+            self.clear_selection()
+            return
+        self.selection, self.selection_size = box, self.base_image.size
+        self.update_status(f"Selected {box[2] - box[0]}x{box[3] - box[1]} at ({box[0]}, {box[1]}); Esc to clear")
+
+    def clear_selection(self):
+        self.selection = self.selection_size = None
+        self.preview.set_selection(None)
+
+    def create_filmstrip(self):
+        self.filmstrip = ctk.CTkScrollableFrame(self, orientation="horizontal", height=100)
+        self.filmstrip.grid(row=1, column=1, sticky="we", padx=10, pady=5)
+
+    def add_tab(self, document):
+        button = ctk.CTkButton(
+            self.filmstrip, text=document.name, width=90, compound="top", border_width=0,
+            command=lambda: self.select_document(document)
+        )
+        # right click closes the image
+        button.bind("<Button-3>", lambda e: self.close_document(document))
+        button.pack(side='left', padx=3)
+        self.tabs[document.id] = (button, None)
+        self.refresh_thumbnail(document)
+
+    def refresh_thumbnail(self, document):
+        # thumbnails are made in the background; each document has its own key so they do not supersede each other
+        if document.id not in self.tabs or document.base is None:
+            return
+
+        def done(thumbnail: Image.Image):
+            if document.id not in self.tabs:
+                return
+            button, _ = self.tabs[document.id]
+            ctk_image = ctk.CTkImage(light_image=thumbnail, size=thumbnail.size)
+            button.configure(image=ctk_image)
+            self.tabs[document.id] = (button, ctk_image)
+
+        self.tasks.submit(
+            f'thumbnail:{document.id}', ImageProcessor.thumbnail, document.base.image, FILMSTRIP_THUMBNAIL_SIZE,
+            on_done=done
+        )
+
+    def highlight_tab(self):
+        for document_id, (button, _) in self.tabs.items():
+            button.configure(border_width=2 if self.document and document_id == self.document.id else 0)
+
+    def select_document(self, document):
+        if document is self.document:
+            return
+        if document.resident and document.base is not None:
+            self.activate_document(document)
+            return
+        self.update_status(f"Restoring {document.name}...")
+        self.activating = document
+        self.tasks.submit(
+            'activate', document.restore,
+            on_done=self.activate_document, on_error=lambda e: self.update_status(f"Restore failed: {e}")
+        )
+
+    def activate_document(self, document):
+        if document not in self.workspace.documents:
+            # closed while it was being restored
+            return
+        # results computed for the previous image must not land on this one
+        for key in ('edit', 'render', 'compress', 'activate', 'animation'):
+            self.tasks.cancel(key)
+        self.activating = None
+        self.workspace.activate(document)
+        if not document.resident or document.base is None:
+            # evicted between the click and now; active documents are never evicted, so this restore sticks
+            self.activating = document
+            self.tasks.submit('activate', document.restore, on_done=self.activate_document)
+            return
+        self.processed_image = self.base_image
+        self.clear_selection()
+        self.update_ui()
+        self.highlight_tab()
+        self.update_status(f"Editing {document.name}")
+        self.enforce_memory_budget()
+
+    def enforce_memory_budget(self):
+        # least recently used images leave memory for the compressed disk cache
+        for document in self.workspace.over_budget():
+            self.tasks.submit(f'evict:{document.id}', self.workspace.evict, document)
+
+    def close_document(self, document=None):
+        document = document or self.document
+        if document is None:
+            return
+        button, _ = self.tabs.pop(document.id)
+        button.destroy()
+        self.tasks.cancel(f'thumbnail:{document.id}')
+        self.tasks.cancel(f'evict:{document.id}')
+        self.tasks.cancel(f'load:{document.id}')
+        self.load_waiters.pop(document.id, None)
+        if document is self.activating:
+            self.tasks.cancel('activate')
+            self.activating = None
+        was_active = document is self.document
+        index = self.workspace.documents.index(document)
+        self.workspace.remove(document)
+        if not was_active:
+            return
+        if self.workspace.documents:
+            self.select_document(self.workspace.documents[min(index, len(self.workspace.documents) - 1)])
+        else:
+            for key in ('edit', 'render', 'compress', 'activate', 'animation'):
+                self.tasks.cancel(key)
+            self.processed_image = None
+            self.preview.clear()
+            self.update_status(f"Closed {document.name}")
 
     def create_status_bar(self):
         self.status_var = tk.StringVar()
         bar = ctk.CTkLabel(self, textvariable=self.status_var, height=20, anchor='w')
-        bar.grid(row=1, column=0, columnspan=2, sticky="we")
+        bar.grid(row=2, column=0, columnspan=2, sticky="we")
+
+        self.busy_var = tk.StringVar()
+        busy = ctk.CTkLabel(self, textvariable=self.busy_var, height=20, anchor='e')
+        busy.grid(row=2, column=1, sticky="e", padx=10)
+
+        self.latency_var = tk.StringVar()
+        self.latency_bar = ctk.CTkLabel(self, textvariable=self.latency_var, height=20, anchor='w')
+        self.latency_bar.grid(row=3, column=0, columnspan=2, sticky="we")
+        self.latency_bar.grid_remove()
+        self.latency_job = None
+        self.refresh_latency()
+
+    def apply_profiling(self):
+        if self.show_latency or self.profile_memory or os.environ.get(TRACE_ENV):
+            Profiler.enable(memory=self.profile_memory)
+        else:
+            Profiler.disable()
+
+    def refresh_latency(self):
+        # rolling latency of the last few operations, refreshed on a timer rather than per span
+        if self.latency_job is not None:
+            self.after_cancel(self.latency_job)
+            self.latency_job = None
+        if not self.show_latency:
+            self.latency_bar.grid_remove()
+            return
+        self.latency_bar.grid()
+        usage = ImageHandle.memory_usage()
+        buffers = f"{usage['unique_buffers']} image buffers, {usage['bytes'] / 2 ** 20:.0f} MB"
+        self.latency_var.set(f"{Profiler.format_rolling() or 'No timings yet'}  |  {buffers}")
+        self.latency_job = self.after(LATENCY_REFRESH_MS, self.refresh_latency)
+
+    def export_trace(self):
+        path = filedialog.asksaveasfilename(defaultextension='.json', filetypes=[('Chrome trace', '*.json')])
+        if not path:
+            return
+        try:
+            Profiler.export_chrome_trace(path)
+            self.update_status(f"Trace saved to: {path}")
+        except Exception as e:
+            logging.warning(f"Trace export failed: {e}")
+            self.update_status("Trace export error")
+
+    def set_busy(self, busy: bool):
+        self.busy_var.set("Working..." if busy else "")
 
     def update_status(self, msg: str):
         self.status_var.set(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}")
 
     def load_initial_image(self):
-        self.load_from_clipboard()
+        if self.startup_paths:
+            self.open_paths(self.startup_paths)
+        else:
+            self.load_from_clipboard(only_if_changed=True)
 
-    def set_image(self, img: Image.Image):
-        if img is None:
-            return
-        self.original_image = img.copy()
-        self.base_image = img.copy()
-        self.processed_image = img.copy()
+    def update_ui(self):
+        self.processed_stale = False
+        self.compressed = None
         self.current_scale = DEFAULT_SCALE
-        self.update_ui()
 
-    def update_ui(self):
-        self.update_preview()
-        self.width_var.set(str(self.processed_image.width))
-        self.height_var.set(str(self.processed_image.height))
+        # a selection only means something on an image of the size it was drawn on
+        if self.selection is not None and self.selection_size != self.base_image.size:
+            self.clear_selection()
+
+        # mipmaps belong to one base image; any edit replaces them
+        if self.pyramid is not None:
+            self.pyramid.cancel()
+        self.pyramid = MipmapPyramid(self.base_image)
+        self.preview.pyramid = self.pyramid
+        self.tasks.submit('pyramid', self.pyramid.build)
+
+        self.preview.show(self.base_image)
+        if self.document.animation is not None:
+            self.play_animation()
+        width, height = self.full_size()
+        self.width_var.set(str(width))
+        self.height_var.set(str(height))
         self.scale_slider.configure(from_=self.min_scale, to=self.max_scale)
         self.scale_slider.set(DEFAULT_SCALE)
         self.scale_label.configure(text=f"{DEFAULT_SCALE}%")
-
-    def update_preview(self):
-        if not self.processed_image:
+        for slider in self.adjustment_sliders.values():
+            slider.set(DEFAULT_SCALE)
+
+    def full_size(self) -> tuple:
+        # a draft stands in for a large file until it is decoded; the sizes shown and typed are the file's
+        if self.document.loading:
+            return self.document.loader.size
+        return self.base_image.size
+
+    def load_image(self, img: Image.Image, status: str, name: str = None, loader: "LazyImage" = None):
+        from animation import Animation
+        # every load opens a new image in the workspace; the ones already open keep their edits
+        with Profiler.span("editor.load_image", img):
+            # animations keep only their source; the first frame is what gets edited and shown
+            if animation := Animation.open(img):
+                with img:
+                    img = img.convert(animation.mode)
+                status = f"{status} ({animation.n_frames} frames)"
+            # decode now (and release an opened file); the pixels are then shared, not copied
+            img.load()
+            document = self.workspace.add(img, name or f"Image {len(self.tabs) + 1}", animation, loader)
+        self.add_tab(document)
+        self.activate_document(document)
+        self.update_status(status)
+
+    def play_animation(self):
+        # every frame gets the recipe at preview size in the background; playback starts once they are ready
+        base = self.base_image
+
+        def ready(result: tuple):
+            if self.base_image is base:
+                self.preview.play(*result)
+
+        self.tasks.submit('animation', self.document.animation.preview, self.pipeline.plan(), on_done=ready)
+
+    def recipe(self) -> list:
+        # the recorded edits plus what is still pending on the sliders, as export applies them to every frame
+        operations = self.pipeline.applied() + [self.in_selection(op) for op in self.pending_adjustments()]
+        if self.current_scale != DEFAULT_SCALE:
+            operations.append({"op": "scale", "factor": self.current_scale / DEFAULT_SCALE})
+        return operations
+
+    def load_from_clipboard(self, only_if_changed: bool = False):
+        # skip grabbing and decoding entirely when the clipboard still holds what we loaded last time
+        changed = ClipboardManager.clipboard_changed()
+        if only_if_changed and not changed:
             return
-
-        preview = self.processed_image.copy()
-        preview.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
-
-        tkimg = ctk.CTkImage(light_image=preview, size=preview.size)
-        self.preview_label.configure(image=tkimg)
-        self.preview_label.image = tkimg
-
-    def load_from_clipboard(self):
         if img := ClipboardManager.get_image_from_clipboard():
-            self.set_image(img)
-            self.update_status("Image loaded from clipboard")
-            self.changes_history.add(img)
+            self.load_image(img, "Image loaded from clipboard", name=f"Clipboard {datetime.now().strftime('%H:%M:%S')}")
         else:
             self.update_status("No image in clipboard")
 
@@ -197,41 +571,183 @@ class ImageEditorUI(ctk.CTk):
         path = filedialog.askopenfilename()
         if not path:
             return
+        self.open_file(path)
+
+    def open_paths(self, paths: list):
+        for path in paths:
+            self.open_file(path)
+        self.show_window()
+
+    def open_file(self, path: str):
+        # large files open from a draft read off the header and a few rows; the full decode waits for an edit
+        from lazy_loader import LazyImage
+        name = os.path.basename(path)
         try:
-            img = Image.open(path)
-            self.set_image(img)
-            self.update_status(f"Loaded: {path}")
-            self.changes_history.add(img)
+            loader = LazyImage(path)
+            if loader.n_frames > 1:
+                self.load_image(Image.open(path), f"Loaded: {path}", name=name)
+            elif not loader.is_large():
+                self.load_image(loader.load(), f"Loaded: {path}", name=name)
+            elif (draft := loader.draft(THUMBNAIL_SIZE)) is not None:
+                width, height = loader.size
+                self.load_image(draft, f"Loaded: {path} ({width}x{height}, preview)", name=name, loader=loader)
+            else:
+                # nothing to preview without decoding all of it, which then happens off the Tk thread
+                self.update_status(f"Decoding {name}...")
+                self.tasks.submit(
+                    f'open:{path}', loader.load,
+                    on_done=lambda img: self.load_image(img, f"Loaded: {path}", name=name),
+                    on_error=lambda e: self.update_status(f"Error loading image: {e}")
+                )
         except Exception as e:
             logging.warning(f"Failed loading image: {e}")
-            self.update_status("Error loading image")
+            self.update_status(f"Error loading image: {e}")
 
-    def convert_to_grayscale(self):
-        if not self.base_image:
+    def when_loaded(self, callback):
+        """Runs callback once the active document holds full-resolution pixels, decoding them if it is a draft."""
+        document = self.document
+        if not document.loading:
+            callback()
+            return
+        waiting = self.load_waiters.setdefault(document.id, [])
+        waiting.append(callback)
+        if len(waiting) > 1:
             return
-        self.base_image = ImageProcessor.to_grayscale(self.base_image)
-        self.processed_image = self.base_image.copy()
-        self.changes_history.add(self.processed_image)
-        self.update_ui()
-        self.update_status("Converted to grayscale")
 
-    def lower_quality(self):
+        def done(image: Image.Image):
+            draft_size = document.base.image.size
+            document.finish_loading(image)
+            callbacks = self.load_waiters.pop(document.id, [])
+            if document is not self.document:
+                return
+            self.show_full_resolution(draft_size)
+            for queued in callbacks:
+                queued()
+
+        def failed(e):
+            self.load_waiters.pop(document.id, None)
+            self.update_status(f"Decoding {document.name} failed: {e}")
+
+        self.update_status(f"Decoding {document.name} at full resolution...")
+        self.tasks.submit(f'load:{document.id}', document.loader.load, on_done=done, on_error=failed)
+
+    def show_full_resolution(self, draft_size: tuple):
+        # the decoded image replaces the draft without touching the sliders or the selection
+        if self.selection is not None:
+            ratio = self.base_image.width / draft_size[0]
+            self.selection = tuple(round(value * ratio) for value in self.selection)
+            self.selection_size = self.base_image.size
+            self.preview.set_selection(self.selection)
+        self.processed_image = self.base_image
+        self.compressed = None
+        if self.pyramid is not None:
+            self.pyramid.cancel()
+        self.pyramid = MipmapPyramid(self.base_image)
+        self.preview.pyramid = self.pyramid
+        self.tasks.submit('pyramid', self.pyramid.build)
+        if self.processed_stale:
+            self.show_pending_preview()
+        else:
+            self.preview.show(self.base_image)
+        self.update_status(f"Decoded {self.document.name}")
+
+    def show_edit(self, status: str):
+        # edits replay from the original; states that were rendered before come from the cache
+        plan = self.pipeline.plan()
+
+        def done(img: Image.Image):
+            self.base_image = img
+            self.processed_image = self.base_image
+            self.update_ui()
+            self.update_status(status)
+            self.enforce_memory_budget()
+
+        self.tasks.cancel('render')
+        if (img := self.pipeline.cached(plan)) is not None:
+            self.tasks.cancel('edit')
+            done(img)
+            return
+        self.tasks.submit(
+            'edit', self.pipeline.render, plan,
+            on_done=done, on_error=lambda e: self.update_status(f"Edit failed: {e}")
+        )
+
+    def apply_edit(self, operation: dict, status: str):
         if not self.base_image:
             return
-        self.base_image = ImageProcessor.lower_quality(self.base_image)
-        self.processed_image = self.base_image.copy()
-        self.changes_history.add(self.processed_image)
-        self.update_ui()
-        self.update_status("Applied low quality")
+        if self.document.loading:
+            self.when_loaded(lambda: self.apply_edit(operation, status))
+            return
+        try:
+            if operation is not None:
+                validate_operation(operation)
+        except (KeyError, ValueError) as e:
+            logging.warning(f"Invalid edit {operation}: {e}")
+            self.update_status(f"Edit error: {e}")
+            return
+        # adjustments and a scale picked on the sliders become part of the recipe before the next edit
+        factor = self.current_scale / DEFAULT_SCALE
+        for pending in self.pending_adjustments():
+            self.pipeline.push(self.in_selection(pending))
+        if self.current_scale != DEFAULT_SCALE:
+            self.pipeline.push({"op": "scale", "factor": factor})
+        if operation is not None:
+            operation = self.in_selection(operation, factor)
+            self.pipeline.push(operation)
+            if "box" in operation:
+                status = f"{status} (selection)"
+        self.show_edit(status)
+
+    def in_selection(self, operation: dict, factor: float = 1.0) -> dict:
+        # edits that can work on a region only touch the selected pixels, in the coordinates they will see
+        if self.selection is None or operation["op"] not in REGION_OPERATIONS:
+            return operation
+        return dict(operation, box=[round(value * factor) for value in self.selection])
+
+    def pending_adjustments(self) -> list:
+        operations = []
+        for text, (name, parameter, _, _) in ADJUSTMENTS.items():
+            value = round(self.adjustment_sliders[text].get())
+            if value != DEFAULT_SCALE:
+                operations.append({"op": name, parameter: value / DEFAULT_SCALE})
+        return operations
+
+    def apply_adjustments(self):
+        if self.pending_adjustments():
+            self.apply_edit(None, status="Applied adjustments")
+
+    def convert_to_grayscale(self):
+        self.apply_edit({"op": "grayscale"}, status="Converted to grayscale")
+
+    def lower_quality(self):
+        self.apply_edit({"op": "lower_quality"}, status="Applied low quality")
+
+    def pixelate(self):
+        self.apply_edit({"op": "pixelate", "block": PIXELATE_BLOCK}, status="Pixelated")
+
+    def invert_colors(self):
+        self.apply_edit({"op": "invert"}, status="Inverted colors")
 
     def revert_to_original(self):
-        if not self.original_image:
+        if not self.original_image or self.document.loading:
             return
-        self.base_image = self.original_image.copy()
-        self.processed_image = self.original_image.copy()
-        self.changes_history.add(self.processed_image)
-        self.update_ui()
-        self.update_status("Reverted to original image")
+        self.pipeline.push({"op": "revert"})
+        self.show_edit("Reverted to original image")
+
+    def move_history(self, steps: list):
+        """Applies undo (-1) and redo (1) steps in order, then shows only the state they end on."""
+        if not self.document:
+            return
+        # the recorded edits are the undo history; stepping them only moves a pointer
+        edited = False
+        for step in steps:
+            edited = (self.pipeline.undo() if step < 0 else self.pipeline.redo()) or edited
+
+        net = sum(steps)
+        status = ("Undo" if net < 0 or (net == 0 and steps[-1] < 0) else "Redo") + \
+            (f" x{abs(net)}" if abs(net) > 1 else "")
+        if edited:
+            self.show_edit(status)
 
     def on_scale_slide(self, val: float):
         # only update the numbers immediately
@@ -243,58 +759,280 @@ class ImageEditorUI(ctk.CTk):
         self.scale_label.configure(text=f"{int(scale)}%")
 
         # compute and show the new dimensions
-        width = int(self.base_image.width * scale / DEFAULT_SCALE)
-        height = int(self.base_image.height * scale / DEFAULT_SCALE)
+        width, height = (int(value * scale / DEFAULT_SCALE) for value in self.full_size())
         self.width_var.set(str(width))
         self.height_var.set(str(height))
 
-        # cancel any pending preview‐update job, then schedule a new one
-        if hasattr(self, 'preview_job'):
-            self.after_cancel(self.preview_job)
+        # scale the cached preview of base_image right away; the full-resolution
+        # render is deferred until copy/save actually needs the pixels
+        self.processed_stale = True
+        self.compressed = None
+        self.tasks.cancel('render')
+        self.tasks.cancel('compress')
+        self.show_pending_preview()
 
-        def do_preview():
-            # this will actually scale the full image and then show it
-            self.processed_image = ImageProcessor.scale(
-                self.base_image,
-                self.current_scale / DEFAULT_SCALE
-            )
-            self.update_preview()
+    def on_adjust_slide(self, val: float):
+        if not self.base_image:
+            return
+        self.processed_stale = True
+        self.compressed = None
+        self.tasks.cancel('render')
+        self.tasks.cancel('compress')
+        self.show_pending_preview()
+
+    def show_pending_preview(self):
+        # slider changes are previewed on the cached preview image; one fused lookup pass is cheap at this size
+        proxy = self.preview.preview_of(self.base_image)
+        if adjustments := self.pending_adjustments():
+            # planned like the full render, with the selection in the preview's coordinates
+            ratio = proxy.width / self.base_image.width
+            for step in build_plan(proxy.size, proxy.mode, [self.in_selection(op, ratio) for op in adjustments]):
+                proxy = apply_step(proxy, step)
+        if self.current_scale != DEFAULT_SCALE:
+            width = max(1, int(self.base_image.width * self.current_scale / DEFAULT_SCALE))
+            height = max(1, int(self.base_image.height * self.current_scale / DEFAULT_SCALE))
+            proxy = ImageProcessor.resize(proxy, *ImageProcessor.fit_size(width, height, THUMBNAIL_SIZE))
+        self.preview.show_transient(proxy)
+
+    def with_processed(self, callback):
+        # hands the full-resolution result to callback, rendering it in the background if stale
+        if self.document.loading:
+            self.when_loaded(lambda: self.with_processed(callback))
+            return
+        if not self.processed_stale:
+            callback(self.processed_image)
+            return
 
-        # wait 300ms after the last slide event before running it
-        self.preview_job = self.after(300, do_preview)
+        def done(img: Image.Image):
+            self.processed_image = img
+            self.processed_stale = False
+            callback(img)
+
+        factor = self.current_scale / DEFAULT_SCALE
+        adjustments = self.pending_adjustments()
+        on_error = lambda e: self.update_status(f"Scale failed: {e}")
+        if factor < 1 and not adjustments:
+            # downscales only need a final resample from the nearest mipmap level
+            size = (max(1, int(self.base_image.width * factor)), max(1, int(self.base_image.height * factor)))
+            self.tasks.submit('render', self.pyramid.resize, size, on_done=done, on_error=on_error)
+            return
+
+        # upscales fuse with any trailing resize in the recipe, adjustments with any trailing adjustments
+        plan = self.pipeline.plan([self.in_selection(op) for op in adjustments] + [{"op": "scale", "factor": factor}])
+        if (img := self.pipeline.cached(plan)) is not None:
+            done(img)
+            return
+        self.tasks.submit('render', self.pipeline.render, plan, on_done=done, on_error=on_error)
 
     def resize_image(self):
         if not self.base_image:
             return
         try:
             w, h = int(self.width_var.get()), int(self.height_var.get())
-            self.base_image = ImageProcessor.resize(self.base_image, w, h)
-            self.processed_image = self.base_image.copy()
-            self.changes_history.add(self.processed_image)
-            self.update_ui()
-            self.update_status(f"Resized to {w}x{h}")
-        except Exception as e:
+        except ValueError as e:
             logging.warning(f"Resize failed: {e}")
             self.update_status("Resize error")
+            return
+        self.apply_edit({"op": "resize", "width": w, "height": h}, status=f"Resized to {w}x{h}")
+
+    def compress_image(self):
+        if not self.processed_image:
+            return
+        target = self.compress_target_kb * 1024
+
+        def done(result):
+            self.compressed = result
+            self.preview.show(result.image)
+            fits = "" if result.size <= target else f", over the {self.compress_target_kb} KB target"
+            self.update_status(f"Compressed to {result.size // 1024} KB ({result.describe()}{fits})")
+
+        def compress(img: Image.Image):
+            from compressor import ImageCompressor
+            # encode attempts are memoized per image, so retries with a new target are cheap
+            if self.compressor is None or self.compressor.image is not img:
+                self.compressor = ImageCompressor(img)
+            self.tasks.submit(
+                'compress', self.compressor.compress, target,
+                on_done=done, on_error=lambda e: self.update_status(f"Compression failed: {e}")
+            )
+
+        self.with_processed(compress)
 
     def copy_to_clipboard(self):
         if not self.processed_image:
             return
-        success = ClipboardManager.copy_image_to_clipboard(self.processed_image)
-        self.update_status("Image copied to clipboard" if success else "Copy failed")
+
+        def copy(img: Image.Image):
+            compressed = self.compressed
+            if compressed is None:
+                success = ClipboardManager.copy_image_to_clipboard(img)
+                status = "Image copied to clipboard"
+            elif ClipboardManager.takes_encoded(compressed.format):
+                # the compressed file itself, so pasting it keeps the size it was compressed to
+                success = ClipboardManager.copy_encoded_to_clipboard(compressed.data, compressed.format)
+                status = f"Copied {compressed.size // 1024} KB {compressed.format} to clipboard"
+            else:
+                success = ClipboardManager.copy_image_to_clipboard(compressed.image)
+                status = "This clipboard only takes pixels; copied the compressed image uncompressed"
+            self.update_status(status if success else "Copy failed")
+
+        self.with_processed(copy)
+
+    def get_exporter(self):
+        # the encoder pools are set up by the first save or export
+        if self.exporter is None:
+            from exporter import Exporter
+            self.exporter = Exporter()
+        return self.exporter
 
     def save_image(self):
+        from exporter import EXTENSIONS, ExportTarget, merged_options
         if not self.processed_image:
             return
-        path = filedialog.asksaveasfilename(defaultextension='.png', filetypes=[('PNG', '*.png'), ('All', '*.*')])
+        animation = self.document.animation
+        compressed = self.compressed if animation is None else None
+        if animation is not None:
+            extension = EXTENSIONS[animation.format]
+            filetypes = [(animation.format, '*' + extension), ('All', '*.*')]
+        elif compressed is not None:
+            extension = compressed.extension
+            filetypes = [(compressed.format, '*' + extension), ('All', '*.*')]
+        else:
+            extension, filetypes = '.png', [('PNG', '*.png'), ('All', '*.*')]
+        path = filedialog.asksaveasfilename(defaultextension=extension, filetypes=filetypes)
         if not path:
             return
+
+        if compressed is not None and path.lower().endswith(extension):
+            # write the already encoded bytes instead of re-encoding
+            self.tasks.submit(
+                'save', write_bytes, path, compressed.data,
+                on_done=lambda _: self.update_status(f"Saved {compressed.size // 1024} KB to: {path}"),
+                on_error=lambda e: self.update_status("Save error")
+            )
+            return
+
+        target = ExportTarget(path)
+        target.options = merged_options(target.format, self.export_options.get(target.format))
+
+        def saved(results: list):
+            result = results[0]
+            self.update_status("Save error" if result.error else f"Saved {result.describe()} to: {path}")
+
+        def save(img: Image.Image):
+            self.tasks.submit(
+                'save', self.get_exporter().export, img, [target],
+                on_done=saved, on_error=lambda e: self.update_status("Save error")
+            )
+
+        if animation is not None:
+            self.tasks.submit(
+                'save', self.get_exporter().export_animation, animation, self.recipe(), [target],
+                on_done=saved, on_error=lambda e: self.update_status("Save error")
+            )
+            return
+        self.with_processed(save)
+
+    def open_export_window(self):
+        from exporter import merged_options
+        if getattr(self, 'export_window', None) is not None:
+            self.export_window.focus_force()
+            return
+
+        self.export_window = ctk.CTkToplevel(self)
+        self.export_window.title("Export")
+        self.export_window.geometry("460x320")
+        self.export_window.protocol("WM_DELETE_WINDOW", self.close_export_window)
+
+        container = ctk.CTkFrame(self.export_window)
+        container.pack(fill='both', expand=True, padx=10, pady=10)
+
+        # one row per format: whether to write it, then its encoder options
+        self.export_format_vars, self.export_option_vars = {}, {}
+        for row, (format, fields) in enumerate(EXPORT_FIELDS.items()):
+            self.export_format_vars[format] = ctk.BooleanVar(value=format in self.export_formats)
+            ctk.CTkCheckBox(container, text=format, variable=self.export_format_vars[format], width=80).grid(
+                row=row, column=0, sticky='w', pady=5)
+            for column, (name, label) in enumerate(fields, start=1):
+                value = merged_options(format, self.export_options.get(format))[name]
+                if isinstance(value, bool):
+                    var = ctk.BooleanVar(value=value)
+                    ctk.CTkCheckBox(container, text=label, variable=var, width=80).grid(row=row, column=column, padx=2)
+                else:
+                    var = tk.StringVar(value=str(value))
+                    field = ctk.CTkFrame(container)
+                    field.grid(row=row, column=column, padx=2)
+                    ctk.CTkLabel(field, text=label).pack(side='left')
+                    ctk.CTkEntry(field, textvariable=var, width=40).pack(side='left')
+                self.export_option_vars[(format, name)] = var
+
+        # sizes, in percent of the current image
+        scales_frame = ctk.CTkFrame(container)
+        scales_frame.grid(row=len(EXPORT_FIELDS), column=0, columnspan=4, sticky='we', pady=5)
+        ctk.CTkLabel(scales_frame, text="Sizes (%):").pack(side='left')
+        self.export_scales_entry = ctk.CTkEntry(scales_frame)
+        self.export_scales_entry.insert(0, self.export_scales)
+        self.export_scales_entry.pack(side='left', fill='x', expand=True)
+
+        ctk.CTkButton(container, text="Export", command=self.export_image).grid(
+            row=len(EXPORT_FIELDS) + 1, column=0, columnspan=4, pady=10)
+
+    def export_image(self):
+        from exporter import EXTENSIONS, ExportTarget, merged_options
+        if not self.processed_image:
+            return
         try:
-            self.processed_image.save(path)
-            self.update_status(f"Saved to: {path}")
-        except Exception as e:
-            logging.warning(f"Save failed: {e}")
-            self.update_status("Save error")
+            formats = [f for f, var in self.export_format_vars.items() if var.get()]
+            options = {f: merged_options(f, {name: var.get() for (fmt, name), var in self.export_option_vars.items()
+                                             if fmt == f}) for f in EXPORT_FIELDS}
+            scales_text = self.export_scales_entry.get()
+            scales = [float(part) for part in scales_text.replace(";", ",").split(",") if part.strip()]
+            if not formats or not scales or min(scales) <= 0:
+                raise ValueError("pick at least one format and positive sizes")
+        except ValueError as e:
+            logging.warning(f"Invalid export settings: {e}")
+            self.update_status(f"Export error: {e}")
+            return
+
+        path = filedialog.asksaveasfilename(title="Export as", filetypes=[('All', '*.*')])
+        if not path:
+            return
+        self.export_options, self.export_formats, self.export_scales = options, formats, scales_text
+        self.save_settings()
+
+        # name.png, name_50.png, name_50.jpg... every format at every size
+        base = os.path.splitext(path)[0]
+        targets = [
+            ExportTarget(f"{base}{'' if scale == 100 else f'_{scale:g}'}{EXTENSIONS[format]}",
+                         format, options[format], scale / 100)
+            for scale in scales for format in formats
+        ]
+
+        def exported(results: list):
+            failed = sum(1 for result in results if result.error)
+            summary = "; ".join(result.describe() for result in results)
+            self.update_status(f"Exported {len(results) - failed}/{len(results)} files: {summary}")
+
+        def export(img: Image.Image):
+            self.tasks.submit(
+                'save', self.get_exporter().export, img, targets,
+                on_done=exported, on_error=lambda e: self.update_status(f"Export error: {e}")
+            )
+
+        self.close_export_window()
+        if self.document.animation is not None:
+            self.update_status(f"Exporting {len(targets)} animated files...")
+            self.tasks.submit(
+                'save', self.get_exporter().export_animation, self.document.animation, self.recipe(), targets,
+                on_done=exported, on_error=lambda e: self.update_status(f"Export error: {e}")
+            )
+            return
+        self.with_processed(export)
+
+    def close_export_window(self):
+        if getattr(self, 'export_window', None):
+            self.export_window.destroy()
+            self.export_window = None
 
     def open_options_page(self):
         if getattr(self, 'options_window', None) is not None:
@@ -304,7 +1042,7 @@ class ImageEditorUI(ctk.CTk):
         # Create options window
         self.options_window = ctk.CTkToplevel(self)
         self.options_window.title("Options")
-        self.options_window.geometry("400x300")
+        self.options_window.geometry("400x420")
         self.options_window.protocol("WM_DELETE_WINDOW", self.close_options_window)
 
         container = ctk.CTkFrame(self.options_window)
@@ -330,10 +1068,38 @@ class ImageEditorUI(ctk.CTk):
         self.max_scale_entry.insert(0, str(self.max_scale))
         self.max_scale_entry.grid(row=0, column=3, padx=2)
 
+        # Compression target
+        compress_frame = ctk.CTkFrame(container)
+        compress_frame.pack(fill='x', pady=5)
+        ctk.CTkLabel(compress_frame, text="Compress Target (KB):").pack(side='left')
+        self.compress_target_entry = ctk.CTkEntry(compress_frame, width=80)
+        self.compress_target_entry.insert(0, str(self.compress_target_kb))
+        self.compress_target_entry.pack(side='right')
+
+        # Workspace memory budget
+        workspace_frame = ctk.CTkFrame(container)
+        workspace_frame.pack(fill='x', pady=5)
+        ctk.CTkLabel(workspace_frame, text="Open Images Memory (MB):").pack(side='left')
+        self.workspace_memory_entry = ctk.CTkEntry(workspace_frame, width=80)
+        self.workspace_memory_entry.insert(0, str(self.workspace_memory_mb))
+        self.workspace_memory_entry.pack(side='right')
+
         # Startup setting
         self.startup_var = ctk.BooleanVar(value=self.run_at_startup)
         ctk.CTkCheckBox(container, text="Run at Windows Startup", variable=self.startup_var).pack(pady=5, anchor='w')
 
+        # Profiling
+        self.latency_setting_var = ctk.BooleanVar(value=self.show_latency)
+        ctk.CTkCheckBox(container, text="Show Latency in Status Bar", variable=self.latency_setting_var).pack(pady=5, anchor='w')
+        self.memory_setting_var = ctk.BooleanVar(value=self.profile_memory)
+        ctk.CTkCheckBox(container, text="Sample Memory Usage", variable=self.memory_setting_var).pack(pady=5, anchor='w')
+        ctk.CTkButton(container, text="Export Trace", command=self.export_trace).pack(pady=5)
+
+        # Local IPC
+        self.ipc_setting_var = ctk.BooleanVar(value=self.ipc_processing)
+        ctk.CTkCheckBox(container, text="Serve Image Processing to Local Tools",
+                        variable=self.ipc_setting_var).pack(pady=5, anchor='w')
+
         # Save button
         ctk.CTkButton(container, text="Save Settings", command=self.save_options).pack(pady=10)
 
@@ -341,8 +1107,9 @@ class ImageEditorUI(ctk.CTk):
         try:
             # Hotkey
             new_hotkey = self.hotkey_entry.get().lower()
+            import keyboard
             keyboard.remove_hotkey(self.toggle_hotkey)
-            keyboard.add_hotkey(new_hotkey, self.toggle_visibility)
+            keyboard.add_hotkey(new_hotkey, self.commands.poster('toggle'))
             self.toggle_hotkey = new_hotkey
 
             # Scale range
@@ -351,18 +1118,32 @@ class ImageEditorUI(ctk.CTk):
             self.min_scale, self.max_scale = new_min, new_max
             self.scale_slider.configure(from_=new_min, to=new_max)
 
+            # Compression target
+            self.compress_target_kb = max(1, int(self.compress_target_entry.get()))
+
+            # Workspace memory budget
+            self.workspace_memory_mb = max(64, int(self.workspace_memory_entry.get()))
+            self.workspace.max_bytes = self.workspace_memory_mb * 1024 * 1024
+            self.enforce_memory_budget()
+
             # Startup
             if self.startup_var.get() != self.run_at_startup:
                 self.run_at_startup = self.startup_var.get()
                 SettingsManager.set_startup(self.run_at_startup)
 
+            # Profiling
+            self.show_latency = self.latency_setting_var.get()
+            self.profile_memory = self.memory_setting_var.get()
+            self.apply_profiling()
+            self.refresh_latency()
+
+            # Local IPC
+            self.ipc_processing = self.ipc_setting_var.get()
+            if self.ipc_server:
+                self.ipc_server.processing = self.ipc_processing
+
             # Persist
-            SettingsManager.save({
-                'hotkey': self.toggle_hotkey,
-                'min_scale': self.min_scale,
-                'max_scale': self.max_scale,
-                'run_at_startup': self.run_at_startup
-            })
+            self.save_settings()
 
             self.close_options_window()
             self.update_status("Settings saved successfully")
@@ -370,6 +1151,23 @@ class ImageEditorUI(ctk.CTk):
             logging.warning(f"Error saving settings: {e}")
             self.update_status(f"Error saving settings: {e}")
 
+    def save_settings(self):
+        SettingsManager.update({
+            'hotkey': self.toggle_hotkey,
+            'min_scale': self.min_scale,
+            'max_scale': self.max_scale,
+            'compress_target_kb': self.compress_target_kb,
+            'run_at_startup': self.run_at_startup,
+            'show_latency': self.show_latency,
+            'profile_memory': self.profile_memory,
+            'export_options': self.export_options,
+            'export_formats': self.export_formats,
+            'export_scales': self.export_scales,
+            'workspace_memory_mb': self.workspace_memory_mb,
+            'ipc_processing': self.ipc_processing,
+            'ipc_port': self.ipc_port
+        })
+
     def close_options_window(self):
         if getattr(self, 'options_window', None):
             self.options_window.destroy()
@@ -379,12 +1177,27 @@ class ImageEditorUI(ctk.CTk):
         if self.state() == 'normal':
             self.withdraw()
         else:
-            self.deiconify()
-            self.lift()
-            self.focus_force()
-            self.load_from_clipboard()
+            self.show_window()
+            self.load_from_clipboard(only_if_changed=True)
+
+    def show_window(self):
+        self.deiconify()
+        self.lift()
+        self.focus_force()
+
+    def destroy(self):
+        # let the clipboard render anything still pending before the owner window goes away
+        ClipboardManager.close()
+        self.tasks.shutdown()
+        if self.exporter is not None:
+            self.exporter.shutdown()
+        if self.ipc_server:
+            self.ipc_server.stop()
+        if trace_path := os.environ.get(TRACE_ENV):
+            Profiler.export_chrome_trace(trace_path)
+        super().destroy()
 
     def on_close(self):
         self.withdraw()
-        if self.tray.icon:
+        if self.tray and self.tray.icon:
             self.tray.icon.visible = True
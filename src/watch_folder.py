@@ -0,0 +1,323 @@
+"""Hot-folder mode: apply the saved recipe to every image that lands in a directory.
+
+    python src/watch_folder.py ~/Screenshots/incoming -o ~/Screenshots/out --op resize=1280x720 --op grayscale --save
+    python src/watch_folder.py                      # watch with the folders and recipe saved in the settings
+
+Uses inotify on Linux and polls the directory elsewhere (or with --poll).
+Files are processed once their size and modification time have stopped
+changing, content already processed with the same recipe is skipped, and
+results are written next to their destination and renamed into place.
+"""
+import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from batch import IMAGE_EXTENSIONS, output_path, parse_operation, process_file
+from edit_pipeline import validate_operation
+from settings import SettingsManager
+
+SETTINGS_KEY = "watch_folder"
+MANIFEST_NAME = ".quickimgeditor-processed.json"
+DEFAULT_SETTLE_SECONDS = 1.0
+DEFAULT_POLL_SECONDS = 1.0
+TICK_SECONDS = 0.25
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+def is_image(path: str) -> bool:
+    return os.path.isfile(path) and os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+
+def scan(directory: str) -> list:
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if is_image(os.path.join(directory, name))]
+
+
+class PollingWatcher:
+    """Reports images whose size or modification time changed since the previous scan."""
+
+    def __init__(self, directory: str, interval: float = DEFAULT_POLL_SECONDS):
+        self.directory = directory
+        self.interval = interval
+        self.seen = {}
+        self.next_scan = 0.0
+        # what is already there is not a change; --existing handles it separately
+        self.changes(0)
+
+    def changes(self, timeout: float) -> list:
+        time.sleep(min(timeout, max(0.0, self.next_scan - time.monotonic())))
+        if time.monotonic() < self.next_scan:
+            return []
+        self.next_scan = time.monotonic() + self.interval
+        changed, current = [], {}
+        for path in scan(self.directory):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            current[path] = (stat.st_size, stat.st_mtime_ns)
+            if self.seen.get(path) != current[path]:
+                changed.append(path)
+        self.seen = current
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Reports images closed after writing or moved into the directory, via inotify."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if self.libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"Cannot watch {directory}")
+
+    def changes(self, timeout: float) -> list:
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        changed, offset = [], 0
+        while offset < len(data):
+            _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b"\0")
+            offset += INOTIFY_EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                # the kernel queue filled up while we were busy: fall back to looking at everything
+                return scan(self.directory)
+            path = os.path.join(self.directory, os.fsdecode(name))
+            if name and is_image(path):
+                changed.append(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def create_watcher(directory: str, poll_interval: float = None):
+    if poll_interval is None and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError) as e:
+            logging.warning(f"inotify unavailable ({e}); polling instead")
+    return PollingWatcher(directory, poll_interval or DEFAULT_POLL_SECONDS)
+
+
+def content_key(path: str, recipe: str) -> str:
+    digest = hashlib.blake2b(recipe.encode(), digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HotFolder:
+    """Watches one directory and feeds settled, unseen images to a bounded process pool.
+
+    At most max_in_flight files are being processed at once; files that
+    settle while the pool is full wait in line, and the watcher is only read
+    while there is room, so a burst of files is absorbed by the kernel queue
+    (or the next directory scan) instead of by memory.
+    """
+
+    def __init__(self, input_dir: str, output_dir: str, operations: list, extension: str = None,
+                 workers: int = None, max_in_flight: int = None, settle: float = DEFAULT_SETTLE_SECONDS,
+                 poll_interval: float = None):
+        self.input_dir = os.path.abspath(input_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.operations = operations
+        self.recipe = json.dumps({"operations": operations, "extension": extension}, sort_keys=True)
+        self.extension = extension
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or self.workers * 2
+        self.settle = settle
+        self.poll_interval = poll_interval
+        # path -> (size, mtime, when that stat was first seen); processed once unchanged for settle seconds
+        self.candidates = {}
+        self.ready = []
+        self.in_flight = set()
+        self.manifest_path = os.path.join(self.output_dir, MANIFEST_NAME)
+        self.manifest = self.load_manifest()
+        self.stats = {"processed": 0, "skipped": 0, "failed": 0}
+
+    def load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logging.error(f"Error loading {self.manifest_path}: {str(e)}")
+            return {}
+
+    def save_manifest(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        temporary = self.manifest_path + ".part"
+        with open(temporary, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(temporary, self.manifest_path)
+
+    def notice(self, path: str):
+        if path.endswith(".part") or os.path.dirname(os.path.abspath(path)) == self.output_dir:
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.candidates.pop(path, None)
+            return
+        seen = self.candidates.get(path)
+        if seen is None or seen[:2] != (stat.st_size, stat.st_mtime_ns):
+            self.candidates[path] = (stat.st_size, stat.st_mtime_ns, time.monotonic())
+
+    def settled(self) -> list:
+        now, settled = time.monotonic(), []
+        for path in list(self.candidates):
+            self.notice(path)
+            seen = self.candidates.get(path)
+            if seen is not None and now - seen[2] >= self.settle:
+                del self.candidates[path]
+                settled.append(path)
+        return settled
+
+    def run(self, process_existing: bool = False, stop=None):
+        os.makedirs(self.output_dir, exist_ok=True)
+        watcher = create_watcher(self.input_dir, self.poll_interval)
+        if process_existing:
+            for path in scan(self.input_dir):
+                self.notice(path)
+        pending = {}
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                while stop is None or not stop.is_set():
+                    # backpressure: only look for more work while there is room for it
+                    if len(pending) + len(self.ready) < self.max_in_flight:
+                        for path in watcher.changes(TICK_SECONDS):
+                            self.notice(path)
+                    elif not pending:
+                        time.sleep(TICK_SECONDS)
+                    self.ready.extend(self.settled())
+
+                    while self.ready and len(pending) < self.max_in_flight:
+                        self.submit(executor, self.ready.pop(0), pending)
+
+                    if pending:
+                        done, _ = wait(pending, timeout=0 if self.candidates else TICK_SECONDS,
+                                       return_when=FIRST_COMPLETED)
+                        for future in done:
+                            self.finish(future, *pending.pop(future))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+
+    def submit(self, executor, source: str, pending: dict):
+        try:
+            key = content_key(source, self.recipe)
+        except OSError as e:
+            logging.error(f"Failed reading {source}: {e}")
+            self.stats["failed"] += 1
+            return
+        if key in self.manifest or key in self.in_flight:
+            self.stats["skipped"] += 1
+            logging.info(f"Skipping {source}: the same content was already processed")
+            return
+        destination = output_path(os.path.basename(source), self.output_dir, self.extension)
+        future = executor.submit(process_file, source, destination, self.operations)
+        pending[future] = (source, destination, key)
+        self.in_flight.add(key)
+
+    def finish(self, future, source: str, destination: str, key: str):
+        self.in_flight.discard(key)
+        try:
+            _, bytes_out, seconds = future.result()
+        except Exception as e:
+            logging.error(f"Failed processing {source}: {e}")
+            self.stats["failed"] += 1
+            return
+        self.stats["processed"] += 1
+        self.manifest[key] = os.path.basename(destination)
+        self.save_manifest()
+        print(f"{source} -> {destination} ({bytes_out // 1024} KB, {seconds:.2f}s)", flush=True)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Apply the saved QuickImgEditor recipe to images dropped in a folder.")
+    parser.add_argument("input", nargs="?", help="directory to watch (default: saved setting)")
+    parser.add_argument("-o", "--output", help="output directory (default: saved setting)")
+    parser.add_argument("--op", action="append", default=[], type=parse_operation, dest="operations",
+                        help="operation to apply, in order (replaces the saved recipe); same syntax as batch.py")
+    parser.add_argument("--recipe", help="JSON file with a list of operations, applied before any --op")
+    parser.add_argument("--format", help="output file extension, e.g. png or webp (default: keep)")
+    parser.add_argument("-j", "--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--max-in-flight", type=int, help="files being processed at once (default: 2x workers)")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help="seconds a file must stay unchanged before it is read")
+    parser.add_argument("--poll", type=float, metavar="SECONDS", help="poll the directory instead of using inotify")
+    parser.add_argument("--existing", action="store_true", help="also process images already in the folder")
+    parser.add_argument("--save", action="store_true", help="store the folders and recipe in the settings")
+    return parser
+
+
+def main(argv: list = None) -> int:
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(message)s")
+    args = build_parser().parse_args(argv)
+    saved = SettingsManager.load().get(SETTINGS_KEY, {})
+
+    operations = []
+    if args.recipe:
+        with open(args.recipe, "r") as f:
+            operations = [validate_operation(op) for op in json.load(f)]
+    operations += args.operations
+    if not operations and not args.recipe:
+        operations = [validate_operation(op) for op in saved.get("operations", [])]
+
+    config = {
+        "input": args.input or saved.get("input"),
+        "output": args.output or saved.get("output"),
+        "operations": operations,
+        "format": args.format or saved.get("format"),
+    }
+    if not config["input"] or not config["output"]:
+        print("An input folder and an output folder are required (or saved with --save)", file=sys.stderr)
+        return 1
+    if not os.path.isdir(config["input"]):
+        print(f"Not a directory: {config['input']}", file=sys.stderr)
+        return 1
+    if args.save:
+        SettingsManager.update({SETTINGS_KEY: config})
+
+    folder = HotFolder(
+        config["input"], config["output"], operations, config["format"],
+        workers=args.workers, max_in_flight=args.max_in_flight, settle=args.settle, poll_interval=args.poll,
+    )
+    print(f"Watching {folder.input_dir} -> {folder.output_dir} (Ctrl+C to stop)", flush=True)
+    folder.run(process_existing=args.existing)
+    stats = folder.stats
+    print(f"{stats['processed']} processed, {stats['skipped']} already done, {stats['failed']} failed")
+    return 0 if not stats["failed"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
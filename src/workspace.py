@@ -0,0 +1,169 @@
+import itertools
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING
+from PIL import Image
+from changes_history import Snapshot
+from edit_pipeline import EditPipeline
+from image_handle import ImageHandle
+from image_processor import ImageProcessor
+
+# only for annotations; the editor imports these when it first opens such a file
+if TYPE_CHECKING:
+    from animation import Animation
+    from lazy_loader import LazyImage
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+class Document:
+    """One open image: its original and its recorded edits, which are also its undo history.
+
+    While the document is inactive its decoded pixels can be evicted: the
+    original is compressed into a Snapshot spilled to disk, and the pipeline
+    cache and latest render are dropped. restore() brings them back.
+    Both may run on worker threads; the lock keeps them from overlapping.
+    A document opened from a draft of a large file holds only the draft until
+    its loader has read the file and finish_loading() has swapped it in.
+    """
+    ids = itertools.count(1)
+
+    def __init__(self, image: Image.Image, name: str, animation: "Animation" = None, loader: "LazyImage" = None):
+        self.id = next(Document.ids)
+        self.name = name
+        # set for animated images; image is then the first frame and edits apply to every frame on export
+        self.animation = animation
+        # set while image is only a draft of the file the loader reads
+        self.loader = loader
+        self.original = ImageHandle(image, "original")
+        self.pipeline = EditPipeline(image)
+        # latest render of the pipeline, what the editor shows for this document
+        self.base = self.original.share("render")
+        self.snapshot = None
+        self.active = False
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def resident(self) -> bool:
+        return self.original is not None
+
+    @property
+    def loading(self) -> bool:
+        return self.loader is not None
+
+    def finish_loading(self, image: Image.Image):
+        with self.lock:
+            self.original = ImageHandle(image, "original")
+            self.pipeline = EditPipeline(image)
+            self.base = self.original.share("render")
+            self.loader = None
+
+    def resident_bytes(self) -> int:
+        if not self.resident:
+            return 0
+        with self.pipeline.lock:
+            images = {id(handle.image): handle.image for handle in self.pipeline.handles()}
+        images[id(self.original.image)] = self.original.image
+        if self.base is not None:
+            images[id(self.base.image)] = self.base.image
+        return sum(ImageProcessor.nbytes(image) for image in images.values())
+
+    def evict(self, directory: str) -> bool:
+        with self.lock:
+            if self.active or not self.resident or self.loading:
+                return False
+            snapshot = Snapshot(self.original.image)
+            snapshot.spill(directory)
+            self.snapshot = snapshot
+            self.pipeline.clear_cache()
+            self.pipeline.original = None
+            self.original = self.base = None
+        return True
+
+    def restore(self) -> "Document":
+        with self.lock:
+            if not self.resident:
+                self.original = ImageHandle(self.snapshot.decode(), "original")
+                self.snapshot.discard()
+                self.snapshot = None
+                self.pipeline.original = self.original.image
+            if self.base is None:
+                self.base = ImageHandle(self.pipeline.render(), "render")
+        return self
+
+    def close(self):
+        if self.snapshot is not None:
+            self.snapshot.discard()
+            self.snapshot = None
+
+
+class Workspace:
+    """The open documents, in tab order, under one memory budget.
+
+    When the resident pixels of all documents exceed max_bytes, the least
+    recently used inactive documents are evicted to a compressed disk cache
+    until the rest fit; selecting one restores it.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.documents = []
+        self.active = None
+        self.spill_dir = None
+
+    def add(self, image: Image.Image, name: str, animation: "Animation" = None,
+            loader: "LazyImage" = None) -> Document:
+        document = Document(image, name, animation, loader)
+        self.documents.append(document)
+        return document
+
+    def remove(self, document: Document):
+        self.documents.remove(document)
+        document.close()
+        if self.active is document:
+            self.active = None
+
+    def activate(self, document: Document):
+        if self.active is not None:
+            self.active.active = False
+        with document.lock:
+            document.active = True
+        document.last_used = time.monotonic()
+        self.active = document
+
+    def resident_bytes(self) -> int:
+        return sum(document.resident_bytes() for document in self.documents)
+
+    def over_budget(self) -> list:
+        """Inactive documents to evict, least recently used first, so the rest fit the budget."""
+        total = self.resident_bytes()
+        victims = []
+        for document in sorted(self.documents, key=lambda d: d.last_used):
+            if total <= self.max_bytes:
+                break
+            if document.active or not document.resident or document.loading:
+                continue
+            victims.append(document)
+            total -= document.resident_bytes()
+        return victims
+
+    def evict(self, document: Document) -> bool:
+        return document.evict(self.get_spill_dir())
+
+    def get_spill_dir(self) -> str:
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix="quickimgeditor-workspace-")
+            weakref.finalize(self, shutil.rmtree, self.spill_dir, True)
+        return self.spill_dir
+
+    def memory_usage(self) -> dict:
+        return {
+            "documents": len(self.documents),
+            "resident_documents": sum(1 for d in self.documents if d.resident),
+            "resident_bytes": self.resident_bytes(),
+            "disk_bytes": sum(d.snapshot.disk_bytes for d in self.documents if d.snapshot is not None),
+        }
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# the modules in src import each other by bare name, as they do when the app runs
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+class FakeApp:
+    """Stands in for the Tk root: after() only records what the loop would run."""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, delay, callback):
+        self.scheduled.append(callback)
+
+    def run_pending(self):
+        while self.scheduled:
+            self.scheduled.pop(0)()
+
+
+@pytest.fixture
+def app():
+    return FakeApp()
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+from PIL import Image
+
+import batch
+from batch import parse_operation, process_file, run
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    directory = tmp_path / "in"
+    directory.mkdir()
+    for index in range(3):
+        Image.new("RGB", (40, 30), (index * 60, 0, 0)).save(directory / f"{index}.png")
+    return batch.find_inputs([str(directory)], False)
+
+
+def test_parse_operation():
+    assert parse_operation("scale=0.5") == {"op": "scale", "factor": 0.5}
+    assert parse_operation("resize=80x60") == {"op": "resize", "width": 80, "height": 60}
+    assert parse_operation("pixelate=12@1,2,30,40") == {"op": "pixelate", "block": 12, "box": [1, 2, 30, 40]}
+    with pytest.raises(ValueError):
+        parse_operation("scale=-1")
+
+
+def test_rerun_skips_only_while_recipe_and_source_are_unchanged(inputs, tmp_path):
+    output = str(tmp_path / "out")
+    assert run(inputs, output, [parse_operation("scale=0.5")], workers=1)["processed"] == 3
+    assert run(inputs, output, [parse_operation("scale=0.5")], workers=1)["skipped"] == 3
+
+    stats = run(inputs, output, [parse_operation("scale=0.25")], workers=1)
+    assert stats["processed"] == 3
+    with Image.open(os.path.join(output, "0.png")) as result:
+        assert result.size == (10, 7)
+
+    assert run(inputs, output, [parse_operation("scale=0.25")], workers=1, extension="jpg")["processed"] == 3
+    os.utime(inputs[1][0], ns=(0, 0))
+    assert run(inputs, output, [parse_operation("scale=0.25")], workers=1)["processed"] == 1
+
+
+@pytest.mark.filterwarnings("ignore::PIL.Image.DecompressionBombWarning")
+def test_memory_limited_run_opens_images_over_the_pixel_limit(tmp_path, monkeypatch):
+    source = tmp_path / "huge.png"
+    Image.new("RGB", (400, 300), (10, 20, 30)).save(source)
+    # stands in for a 30k x 30k scan against Pillow's ~179 MP default; strips stay under the limit
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 10000)
+    with pytest.raises(Image.DecompressionBombError):
+        Image.open(source)
+
+    destination = tmp_path / "out.png"
+    process_file(str(source), str(destination), [parse_operation("scale=0.5")], memory_limit=16 * 1024)
+    assert Image.MAX_IMAGE_PIXELS == 10000
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", None)
+    with Image.open(destination) as result:
+        assert result.size == (200, 150)
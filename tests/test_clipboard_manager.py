@@ -0,0 +1,44 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from clipboard_manager import ClipboardBackend, ClipboardManager, FakeClipboardBackend
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = FakeClipboardBackend()
+    monkeypatch.setattr(ClipboardManager, "backend", backend)
+    monkeypatch.setattr(ClipboardManager, "last_token", None)
+    return backend
+
+
+def test_own_copies_are_not_changes(backend):
+    image = Image.new("RGB", (8, 6), (1, 2, 3))
+    assert ClipboardManager.copy_image_to_clipboard(image)
+    assert backend.payload.image is image
+    assert not ClipboardManager.clipboard_changed()
+    assert ClipboardManager.get_image_from_clipboard().getpixel((0, 0)) == (1, 2, 3)
+
+    backend.sequence_number += 1  # someone else copied something
+    assert ClipboardManager.clipboard_changed()
+
+
+def test_encoded_files_are_copied_as_is(backend):
+    output = BytesIO()
+    Image.new("RGB", (8, 6), (200, 10, 10)).save(output, format="JPEG", quality=30)
+    data = output.getvalue()
+    assert ClipboardManager.takes_encoded("JPEG")
+    assert ClipboardManager.copy_encoded_to_clipboard(data, "JPEG")
+    assert backend.encoded == (data, "JPEG")
+    assert not ClipboardManager.clipboard_changed()
+
+
+def test_backends_without_encoded_formats_take_pixels_only(monkeypatch):
+    class PixelsOnly(ClipboardBackend):
+        def set_payload(self, payload, on_published=None):
+            return True
+
+    monkeypatch.setattr(ClipboardManager, "backend", PixelsOnly())
+    assert not ClipboardManager.takes_encoded("JPEG")
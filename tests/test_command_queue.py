@@ -0,0 +1,25 @@
+from command_queue import CommandQueue
+
+
+def test_undo_redo_bursts_coalesce_into_one_history_command(app):
+    calls = []
+    queue = CommandQueue(app, {'history': lambda steps: calls.append(('history', steps)),
+                               'open': lambda paths: calls.append(('open', paths))})
+    queue.post('undo')
+    queue.poster('undo')()
+    queue.post('redo')
+    queue.post('open', ['a.png'])
+    queue.post('undo')
+    # one drain for the whole burst
+    assert len(app.scheduled) == 1
+    app.run_pending()
+    assert calls == [('history', [-1, -1, 1]), ('open', ['a.png']), ('history', [-1])]
+
+
+def test_a_failing_command_does_not_stop_the_rest(app):
+    calls = []
+    queue = CommandQueue(app, {'show': lambda: 1 / 0, 'history': calls.append})
+    queue.post('show')
+    queue.post('redo')
+    app.run_pending()
+    assert calls == [[1]]
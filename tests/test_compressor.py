@@ -0,0 +1,39 @@
+import pytest
+from PIL import Image
+
+from compressor import MAX_QUALITY, ImageCompressor
+
+
+@pytest.fixture
+def compressor():
+    image = Image.merge("RGB", [Image.linear_gradient("L").resize((160, 120)).rotate(angle) for angle in (0, 90, 180)])
+    image.paste(Image.effect_noise((160, 40), 48).convert("RGB"), (0, 40))
+    return ImageCompressor(image)
+
+
+def test_finds_the_highest_quality_under_the_target(compressor):
+    low, high = len(compressor.encode("JPEG", 10)), len(compressor.encode("JPEG", MAX_QUALITY))
+    target = (low + high) // 2
+    result = compressor.compress(target)
+    assert result.format == "JPEG" and result.size <= target
+    assert len(compressor.encode("JPEG", result.quality + 1)) > target
+    assert result.image.size == (160, 120)
+
+
+def test_retries_reuse_earlier_encodes(compressor):
+    compressor.compress(len(compressor.encode("JPEG", 50)))
+    tried = len(compressor.attempts)
+    # a bisection over 5..95 needs only a handful of encodes
+    assert tried <= 9
+    compressor.compress(len(compressor.encode("JPEG", 50)))
+    assert len(compressor.attempts) == tried
+
+
+def test_falls_back_to_a_palette_png_then_the_smallest_attempt(compressor):
+    flat = ImageCompressor(Image.new("RGB", (160, 120), (30, 60, 90)))
+    smallest_jpeg = len(flat.encode("JPEG", 5))
+    result = flat.compress(smallest_jpeg - 1)
+    assert result.format == "PNG" and result.size < smallest_jpeg
+
+    result = compressor.compress(10)
+    assert result.size == min(len(data) for data in compressor.attempts.values())
@@ -0,0 +1,81 @@
+from PIL import Image, ImageOps
+
+from edit_pipeline import EditPipeline, RegionPatch, apply_step, build_plan
+
+
+def test_pending_adjustments_in_a_selection_leave_the_rest_alone():
+    # what the editor renders for brightness on the sliders while a rectangle is selected
+    image = Image.new("RGB", (80, 60), (100, 100, 100))
+    pipeline = EditPipeline(image)
+    plan = pipeline.plan([{"op": "brightness", "factor": 1.5, "box": [10, 10, 30, 20]},
+                          {"op": "scale", "factor": 0.5}])
+    assert plan[0][0] == "region"
+    result = pipeline.render(plan)
+    assert result.size == (40, 30)
+    assert result.getpixel((10, 7)) == (150, 150, 150)
+    assert result.getpixel((30, 20)) == (100, 100, 100)
+
+    # the preview runs the same plan on a smaller copy, with the box scaled to it
+    proxy = image.resize((40, 30))
+    for step in build_plan(proxy.size, proxy.mode, [{"op": "brightness", "factor": 1.5, "box": [5, 5, 15, 10]}]):
+        proxy = apply_step(proxy, step)
+    assert proxy.getpixel((10, 7)) == (150, 150, 150)
+    assert proxy.getpixel((20, 20)) == (100, 100, 100)
+
+
+def test_plan_fuses_resizes_and_adjustments():
+    operations = [{"op": "scale", "factor": 0.5}, {"op": "resize", "width": 30, "height": 20},
+                  {"op": "grayscale"}, {"op": "brightness", "factor": 1.2}, {"op": "gamma", "value": 0.8}]
+    assert build_plan((80, 60), "RGB", operations) == (
+        ("grayscale",), ("resize", 30, 20), ("point", (("brightness", 1.2), ("gamma", 0.8))))
+    # a grayscale right after adjustments joins their pass; one on a gray image is dropped
+    assert build_plan((80, 60), "RGB", [{"op": "invert"}, {"op": "grayscale"}]) == \
+        (("point", (("invert",), ("grayscale",))),)
+    assert build_plan((80, 60), "L", [{"op": "grayscale"}]) == ()
+    # adjustments end a run of resizes, and revert forgets everything before it
+    assert build_plan((80, 60), "RGB", [{"op": "scale", "factor": 0.5}, {"op": "invert"},
+                                        {"op": "scale", "factor": 0.5}]) == \
+        (("resize", 40, 30), ("point", (("invert",),)), ("resize", 20, 15))
+    assert build_plan((80, 60), "RGB", [{"op": "invert"}, {"op": "revert"}]) == ()
+
+
+def gradient(size=(64, 48)) -> Image.Image:
+    return Image.linear_gradient("L").resize(size).convert("RGB")
+
+
+def test_undo_redo_and_eviction_render_the_same_pixels():
+    image = gradient()
+    operations = [{"op": "invert"}, {"op": "scale", "factor": 0.5}, {"op": "pixelate", "block": 4}]
+    reference = EditPipeline(image, operations).render()
+
+    # room for one full-size image: the half-size renders push out the inverted original
+    pipeline = EditPipeline(image, cache_bytes=64 * 48 * 3)
+    for operation in operations:
+        pipeline.push(operation)
+        pipeline.render()
+    assert pipeline.plan()[:1] not in pipeline.cache
+    assert pipeline.undo() and pipeline.undo()
+    assert pipeline.render().tobytes() == ImageOps.invert(image).tobytes()
+    assert pipeline.redo() and pipeline.redo()
+    assert pipeline.render().tobytes() == reference.tobytes()
+
+
+def test_region_patches_follow_the_history():
+    image = Image.new("RGB", (40, 40), (100, 100, 100))
+    pipeline = EditPipeline(image)
+    pipeline.push({"op": "invert", "box": [0, 0, 10, 10]})
+    pipeline.render()
+    assert isinstance(pipeline.cache[pipeline.plan()], RegionPatch)
+
+    # a new edit after undo replaces the undone one; its patch is not pasted from the old state
+    pipeline.undo()
+    assert pipeline.cached(pipeline.plan()) is image
+    pipeline.push({"op": "invert", "box": [20, 20, 30, 30]})
+    result = pipeline.render()
+    assert result.getpixel((5, 5)) == (100, 100, 100)
+    assert result.getpixel((25, 25)) == (155, 155, 155)
+
+    # after the cache is dropped the state is rebuilt from the original
+    pipeline.clear_cache()
+    assert pipeline.cached(pipeline.plan()) is None
+    assert pipeline.render().tobytes() == result.tobytes()
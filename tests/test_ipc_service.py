@@ -0,0 +1,102 @@
+import base64
+import json
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import ipc_service
+from ipc_client import IpcClient
+from ipc_service import IpcServer, run_job
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(ipc_service, "TOKEN_FILE", str(tmp_path / "ipc_token"))
+    server = IpcServer(0, on_show=lambda: None, on_open=lambda paths: None, processing=True)
+    server.start()
+    yield IpcClient(port=server.server_address[1], token=server.token)
+    server.stop()
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "in.png"
+    Image.new("RGBA", (40, 20), (255, 0, 0, 128)).save(path)
+    return str(path)
+
+
+def png_bytes(size=(40, 20)) -> bytes:
+    encoded = BytesIO()
+    Image.new("RGB", size, (0, 0, 255)).save(encoded, "PNG")
+    return encoded.getvalue()
+
+
+def test_run_job_accepts_batch_syntax_and_dicts(source):
+    data = run_job({"input": source, "operations": ["scale=0.5", {"op": "grayscale"}]})
+    with Image.open(BytesIO(data)) as result:
+        assert result.size == (20, 10)
+        assert result.mode == "L"
+
+
+def test_process_file_without_destination_returns_bytes(client, source):
+    data = client.process_file(source, ["scale=0.5"], format="jpg")
+    with Image.open(BytesIO(data)) as result:
+        assert result.format == "JPEG"
+        assert result.size == (20, 10)
+
+
+def test_process_file_with_destination_writes_in_place(client, source, tmp_path):
+    destination = tmp_path / "out" / "result.jpg"
+    summary = client.process_file(source, ["invert"], str(destination))
+    assert summary["size"] == [40, 20]
+    assert summary["bytes"] == destination.stat().st_size
+    assert not (tmp_path / "out" / "result.jpg.part").exists()
+
+
+def test_batch_carries_image_data_both_ways(client, source, tmp_path):
+    results = client.process_many([
+        {"data": png_bytes(), "operations": ["scale=0.25"]},
+        {"input": source, "operations": ["grayscale"], "output": str(tmp_path / "gray.png")},
+        {"input": str(tmp_path / "missing.png")},
+    ])
+    with Image.open(BytesIO(results[0])) as first:
+        assert first.size == (10, 5)
+    assert results[1]["size"] == [40, 20]
+    assert "error" in results[2]
+
+
+def test_json_reply_names_the_format(client, source):
+    body, _ = client.request("POST", "/process", json.dumps({"input": source, "format": "jpg"}).encode())
+    reply = json.loads(body)
+    assert reply["format"] == "JPEG"
+    assert base64.b64decode(reply["data"])[:2] == b"\xff\xd8"
+
+
+def test_raw_process_reports_the_jpeg_mime_type(client):
+    data, content_type = client.request("POST", "/process?op=scale=0.5&format=jpg", png_bytes(),
+                                        "application/octet-stream")
+    assert content_type == "image/jpeg"
+    assert data[:2] == b"\xff\xd8"
+
+
+def test_job_without_operations_returns_the_image(client, source):
+    data = client.process_file(source, [])
+    with Image.open(BytesIO(data)) as result:
+        assert result.size == (40, 20)
+
+
+def test_wrong_token_is_refused(client):
+    with pytest.raises(RuntimeError, match="403"):
+        IpcClient(port=client.port, token="wrong").ping()
+
+
+def test_processing_can_be_turned_off(tmp_path, monkeypatch, source):
+    monkeypatch.setattr(ipc_service, "TOKEN_FILE", str(tmp_path / "ipc_token"))
+    server = IpcServer(0, on_show=lambda: None, on_open=lambda paths: None, processing=False)
+    server.start()
+    try:
+        with pytest.raises(RuntimeError, match="403"):
+            IpcClient(port=server.server_address[1], token=server.token).process_file(source, [])
+    finally:
+        server.stop()
@@ -0,0 +1,42 @@
+import pytest
+from PIL import Image
+
+import lazy_loader
+from lazy_loader import ORIENTATION_TAG, LazyImage
+
+
+@pytest.fixture
+def over_pixel_limit(monkeypatch):
+    # stands in for a >179 MP scan against Pillow's default decompression-bomb limit
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 10000)
+    monkeypatch.setattr(lazy_loader, "LAZY_PIXELS", 10000)
+
+
+@pytest.mark.parametrize("extension", ["jpg", "bmp", "png"])
+def test_opens_images_over_the_pixel_limit(over_pixel_limit, tmp_path, extension):
+    path = str(tmp_path / f"huge.{extension}")
+    Image.new("RGB", (400, 300), (200, 100, 50)).save(path)
+    with pytest.raises(Image.DecompressionBombError):
+        Image.open(path)
+
+    loader = LazyImage(path)
+    assert loader.size == (400, 300) and loader.is_large()
+    draft = loader.draft((100, 100))
+    if extension == "png":
+        assert draft is None
+    else:
+        assert draft.size == (100, 75)
+    assert loader.load().size == (400, 300)
+    assert Image.MAX_IMAGE_PIXELS == 10000
+
+
+def test_draft_and_load_are_upright(tmp_path):
+    path = str(tmp_path / "rotated.jpg")
+    exif = Image.Exif()
+    exif[ORIENTATION_TAG] = 6
+    Image.new("RGB", (400, 200)).save(path, exif=exif)
+
+    loader = LazyImage(path)
+    assert loader.size == (200, 400)
+    assert loader.draft((100, 100)).size == (50, 100)
+    assert loader.load().size == (200, 400)
@@ -0,0 +1,37 @@
+from PIL import Image, ImageChops
+
+from image_processor import ImageProcessor
+from point_ops import apply_adjustments, build_lut
+
+ADJUSTMENTS = (("brightness", 1.4), ("contrast", 0.8), ("gamma", 1.6), ("levels", 20, 230), ("invert",))
+
+
+def max_difference(first: Image.Image, second: Image.Image) -> int:
+    return max(band.getextrema()[1] for band in ImageChops.difference(first, second).split())
+
+
+def test_fused_table_matches_applying_one_at_a_time():
+    image = Image.linear_gradient("L").convert("RGB")
+    sequential = image
+    for adjustment in ADJUSTMENTS:
+        sequential = apply_adjustments(sequential, [adjustment])
+    fused = apply_adjustments(image, ADJUSTMENTS)
+    # one-at-a-time rounds after every step, the fused table only once
+    assert max_difference(fused, sequential) <= 2
+    # values are clamped after every step, as they are when applied one by one
+    assert build_lut([("brightness", 2.0), ("brightness", 0.5)])[200] == 128
+
+
+def test_grayscale_splits_the_chain():
+    image = Image.merge("RGB", [Image.linear_gradient("L").rotate(angle) for angle in (0, 90, 180)])
+    adjustments = (("brightness", 1.2), ("grayscale",), ("gamma", 0.8))
+    expected = apply_adjustments(ImageProcessor.to_grayscale(apply_adjustments(image, adjustments[:1])),
+                                 adjustments[2:])
+    result = apply_adjustments(image, adjustments)
+    assert result.mode == "L"
+    assert max_difference(result, expected) == 0
+
+
+def test_alpha_is_left_alone():
+    image = Image.new("RGBA", (4, 4), (10, 20, 30, 77))
+    assert apply_adjustments(image, [("invert",)]).getpixel((0, 0)) == (245, 235, 225, 77)
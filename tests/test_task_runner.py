@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+
+from task_runner import TaskRunner
+
+
+@pytest.fixture
+def runner(app):
+    runner = TaskRunner(app, max_workers=1)
+    yield runner
+    runner.shutdown()
+
+
+def settle(app, runner):
+    # let the workers finish, then run the result polls on the "Tk loop"
+    runner.executor.submit(lambda: None).result(timeout=5)
+    app.run_pending()
+
+
+def test_only_the_newest_generation_delivers(app, runner):
+    started, release, results = threading.Event(), threading.Event(), []
+
+    def slow(value):
+        started.set()
+        release.wait(5)
+        return value
+
+    runner.submit('render', slow, 1, on_done=results.append)
+    started.wait(5)
+    # the first job is already running; its result must be dropped
+    generation = runner.submit('render', lambda: 2, on_done=results.append)
+    release.set()
+    settle(app, runner)
+    assert results == [2]
+    assert runner.generations['render'] == generation
+    assert not runner.busy('render')
+
+
+def test_cancel_drops_the_result_and_errors_reach_on_error(app, runner):
+    results, errors = [], []
+    runner.submit('edit', lambda: 1, on_done=results.append)
+    runner.cancel('edit')
+    runner.submit('save', lambda: 1 / 0, on_done=results.append, on_error=errors.append)
+    settle(app, runner)
+    assert results == []
+    assert isinstance(errors[0], ZeroDivisionError)
+    assert not runner.busy()
@@ -0,0 +1,34 @@
+import pytest
+from PIL import Image, ImageChops
+
+from edit_pipeline import EditPipeline
+from tiled_processor import TiledProcessor
+
+RECIPES = [
+    [{"op": "scale", "factor": 0.5}],
+    [{"op": "resize", "width": 130, "height": 170}, {"op": "brightness", "factor": 1.3}],
+    [{"op": "grayscale"}, {"op": "scale", "factor": 0.75}, {"op": "gamma", "value": 0.7}],
+    [{"op": "pixelate", "block": 8, "box": [10, 20, 90, 140]}, {"op": "invert", "box": [50, 0, 200, 60]}],
+    [{"op": "lower_quality"}, {"op": "scale", "factor": 0.5}],
+]
+
+
+@pytest.fixture
+def image():
+    # a gradient with a noisy band, so resampling across strip edges shows
+    image = Image.merge("RGB", [Image.linear_gradient("L").resize((200, 150)).rotate(angle) for angle in (0, 90, 180)])
+    image.paste(Image.effect_noise((200, 30), 64).convert("RGB"), (0, 60))
+    return image
+
+
+@pytest.mark.parametrize("operations", RECIPES)
+def test_strips_match_the_full_render(image, tmp_path, operations):
+    pipeline = EditPipeline(image, operations)
+    destination = str(tmp_path / "out.png")
+    # small enough to cut the image into several strips
+    TiledProcessor.render(image, pipeline.plan(), destination, memory_limit=16 * 1024)
+    with Image.open(destination) as tiled:
+        full = pipeline.render()
+        assert (tiled.size, tiled.mode) == (full.size, full.mode)
+        # strip resizes use the full-image weights, up to floating-point rounding
+        assert max(band.getextrema()[1] for band in ImageChops.difference(tiled, full).split()) <= 1